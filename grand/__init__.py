@@ -26,6 +26,8 @@ from .tools.coordinates import (
     Rotation,
 )
 
+from .tools.sampling import TimeAxis
+
 from .logging import getLogger, Logger
 from . import logging, store
 
@@ -47,6 +49,7 @@ __all__ = [
     "SphericalRepresentation",
     "CartesianRepresentation",
     "Rotation",
+    "TimeAxis",
     "GRAND_DATA",
 ]
 
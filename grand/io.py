@@ -14,6 +14,7 @@ from h5py import Dataset as _Dataset, File as _File, Group as _Group
 import numpy
 
 from . import ECEF, LTP, Rotation, CartesianRepresentation
+from .tools.sampling import TimeAxis
 
 __all__ = ["DataNode", "ElementsIterator"]
 
@@ -82,12 +83,19 @@ class DataNode:
     def close(self) -> None:
         self._group.file.close()
 
-    def read(self, *args: str, dtype: Union[numpy.DataType, str, None] = None):
+    def read(
+        self,
+        *args: str,
+        dtype: Union[numpy.DataType, str, None] = None,
+        selection: Any = None,
+    ):
+        """Read data elements. If a *selection* is provided, e.g. a tuple of
+        slices, only the corresponding hyperslab of arrays is read."""
         res = len(args) * [None]
         for i, k in enumerate(args):
             v = self._group[k]
             if type(v) == _Dataset:
-                res[i] = self._unpack(v, dtype)
+                res[i] = self._unpack(v, dtype, selection)
             else:
                 raise KeyError(k)
         if len(res) == 1:
@@ -118,13 +126,20 @@ class DataNode:
         # elif isinstance(v, BaseCoordinateFrame):
         elif isinstance(v, (ECEF, LTP)):  # RK
             self._write_frame(k, v)  # RK. TODO: Recheck this method.
+        elif isinstance(v, TimeAxis):
+            self._write_time_axis(k, v)
         else:
             # self._write_number(k, v, dtype, unit)
             self._write_number(k, v, dtype)  # RK
 
-    def _unpack(self, dset: _Dataset, dtype: Union[numpy.DataType, str, None] = None) -> Any:
+    def _unpack(
+        self,
+        dset: _Dataset,
+        dtype: Union[numpy.DataType, str, None] = None,
+        selection: Any = None,
+    ) -> Any:
         if dset.shape:
-            v = dset[:]
+            v = dset[:] if selection is None else dset[selection]
             if dtype is not None:
                 v = v.astype(dtype)
         else:
@@ -146,6 +161,8 @@ class DataNode:
             return self._unpack_quantity(dset, v)
         elif metatype == "table":
             return self._unpack_table(dset, v)
+        elif metatype == "time-axis":
+            return self._unpack_time_axis(dset, v)
         # elif metatype.startswith('representation'):
         #    return self._unpack_representation(dset, v)
         # elif metatype.startswith('frame'):
@@ -332,6 +349,19 @@ class DataNode:
 
         return dset
 
+    def _write_time_axis(self, k, v) -> _Dataset:
+        # Only (t0, dt, n) are stored, as f8
+        data = numpy.array((v.t0, v.dt, v.n), dtype="f8")
+        dset = self._group.require_dataset(k, data=data, shape=data.shape, dtype=data.dtype)
+        dset.attrs["metatype"] = "time-axis"
+
+        return dset
+
+    @staticmethod
+    def _unpack_time_axis(dset, v):
+        t0, dt, n = dset[:]
+        return TimeAxis(t0, dt, int(n))
+
     def _write_frame(self, k, v):
         if isinstance(v, ECEF):
             # require_dataset(name, shape=None, dtype=None, exact=None, **kwds)
@@ -4,13 +4,58 @@
 from . import DATADIR
 from .._core import ffi, lib
 
+from concurrent.futures import ThreadPoolExecutor, wait
 import datetime
+import os
+import threading
 import numpy
 
 
 __all__ = ["LibraryError", "Snapshot"]
 
 
+_MIN_CHUNK = 10000
+"""Minimum number of points per task, when evaluating in parallel"""
+
+_POOL_SIZE = os.cpu_count() or 1
+"""Number of threads of the shared pool"""
+
+_executor = None
+"""Pool of threads shared by parallel evaluations"""
+
+_executor_lock = threading.Lock()
+"""Lock for creating the pool of threads"""
+
+
+def _get_executor():
+    """Get the shared pool of threads, created on first use
+
+    The pool has a fixed size. It is never replaced, such that concurrent
+    callers can always submit tasks to it.
+    """
+    global _executor
+
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=_POOL_SIZE)
+        return _executor
+
+
+class _Chunks:
+    """Thread safe iterator over chunks of points"""
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._lock = threading.Lock()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        with self._lock:
+            return next(self._chunks)
+
+
 class LibraryError(RuntimeError):
     """A GULL library error"""
 
@@ -49,7 +94,7 @@ class Snapshot:
             valid
         """
         self._snapshot, self._model, self._date = None, None, None
-        self._workspace = ffi.new("double **")
+        self._workspaces, self._lock = [], threading.Lock()
         self._order, self._altitude = None, None
 
         # Create the snapshot object
@@ -84,11 +129,73 @@ class Snapshot:
             return
 
         lib.gull_snapshot_destroy(self._snapshot)
-        lib.gull_snapshot_destroy(ffi.cast("struct gull_snapshot **", self._workspace))
+        for workspace in self._workspaces:
+            lib.gull_snapshot_destroy(ffi.cast("struct gull_snapshot **", workspace))
+        self._workspaces = []
         self._snapshot = None
 
-    def __call__(self, latitude, longitude, altitude=None):
-        """Get the magnetic field at a given Earth location"""
+    def _acquire(self):
+        """Get an idle GULL workspace, or a new one.
+
+        Workspaces are not bound to threads. They are returned to the pool of
+        idle workspaces after each evaluation. Thus, their number is bounded by
+        the maximum number of concurrent evaluations.
+        """
+        with self._lock:
+            if self._workspaces:
+                return self._workspaces.pop()
+        return ffi.new("double **")
+
+    def _release(self, workspace):
+        """Return a workspace to the pool of idle ones"""
+        with self._lock:
+            self._workspaces.append(workspace)
+
+    def _field(self, latitude, longitude, altitude, field, workspace):
+        """Evaluate the magnetic field for contiguous arrays of points"""
+        r = lib.gull_snapshot_field_v(
+            self._snapshot[0],
+            ffi.cast("double *", latitude.ctypes.data),
+            ffi.cast("double *", longitude.ctypes.data),
+            ffi.cast("double *", altitude.ctypes.data),
+            ffi.cast("double *", field.ctypes.data),
+            latitude.size,
+            workspace,
+        )
+        if r != 0:
+            raise LibraryError(r)
+
+    def _worker(self, chunks, latitude, longitude, altitude, field):
+        """Evaluate chunks of points until exhaustion, with a single
+        workspace"""
+        workspace = self._acquire()
+        try:
+            for i0, i1 in chunks:
+                self._field(
+                    latitude[i0:i1],
+                    longitude[i0:i1],
+                    altitude[i0:i1],
+                    field[i0:i1],
+                    workspace,
+                )
+        finally:
+            self._release(workspace)
+
+    def __call__(self, latitude, longitude, altitude=None, workers=1, out=None):
+        """Get the magnetic field at a given Earth location
+
+        Parameters
+        ----------
+        latitude, longitude, altitude : float or numpy.ndarray
+            The geodetic coordinates of the location(s)
+        workers : int, optional
+            The number of threads used for evaluating large arrays. If `None`,
+            the number of CPUs is used. Extra threads are taken from a
+            persistent pool, shared by all snapshots.
+        out : numpy.ndarray, optional
+            A C-contiguous array of doubles, with 3 values per location, where
+            the result is written
+        """
 
         def regularize(a):
             a = numpy.asanyarray(a)
@@ -105,22 +212,56 @@ class Snapshot:
             if latitude.size != altitude.size:
                 raise ValueError("latitude and altitude must have the same size")
 
-        if latitude.size == 1:
+        if out is not None:
+            if (
+                (out.dtype != numpy.float64)
+                or (not out.flags.c_contiguous)
+                or (out.size != 3 * latitude.size)
+            ):
+                raise ValueError("out must be a contiguous array of 3 doubles per location")
+            field = out
+        elif latitude.size == 1:
             field = numpy.zeros(3)
         else:
             field = numpy.zeros((latitude.size, 3))
 
-        r = lib.gull_snapshot_field_v(
-            self._snapshot[0],
-            ffi.cast("double *", latitude.ctypes.data),
-            ffi.cast("double *", longitude.ctypes.data),
-            ffi.cast("double *", altitude.ctypes.data),
-            ffi.cast("double *", field.ctypes.data),
-            latitude.size,
-            self._workspace,
-        )
-        if r != 0:
-            raise LibraryError(r)
+        if workers is None:
+            workers = os.cpu_count() or 1
+        n = latitude.size
+        tasks = min(4 * workers, n // _MIN_CHUNK) if workers > 1 else 1
+
+        if tasks <= 1:
+            workspace = self._acquire()
+            try:
+                self._field(latitude, longitude, altitude, field, workspace)
+            finally:
+                self._release(workspace)
+        else:
+            # Split the points in chunks, processed by at most *workers*
+            # threads of the shared pool. Each thread holds a workspace while
+            # it runs, and the GIL is released during GULL calls.
+            latitude, longitude, altitude = (
+                a.reshape(-1) for a in (latitude, longitude, altitude)
+            )
+            bounds = numpy.linspace(0, n, tasks + 1).astype(int)
+            chunks = _Chunks(zip(bounds[:-1], bounds[1:]))
+            args = (chunks, latitude, longitude, altitude, field.reshape(-1, 3))
+            executor = _get_executor()
+            futures = [
+                executor.submit(self._worker, *args)
+                for _ in range(min(workers, tasks, _POOL_SIZE + 1) - 1)
+            ]
+            # The calling thread processes chunks as well. Tasks that did not
+            # start before all chunks were taken are cancelled. Thus, the
+            # evaluation completes even if the pool is busy, e.g. when called
+            # from one of its threads.
+            try:
+                self._worker(*args)
+            finally:
+                futures = [future for future in futures if not future.cancel()]
+                wait(futures)
+            for future in futures:
+                future.result()
 
         return field
 
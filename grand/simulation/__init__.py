@@ -2,7 +2,9 @@ from .antenna import (
     Antenna,
     AntennaModel,
     ElectricField,
+    FFTBackend,
     MissingFrameError,
+    ProcessingChain,
     TabulatedAntennaModel,
     Voltage,
 )
@@ -14,7 +16,9 @@ __all__ = [
     "AntennaModel",
     "CoreasShower",
     "ElectricField",
+    "FFTBackend",
     "MissingFrameError",
+    "ProcessingChain",
     "ParticleCode",
     "ShowerEvent",
     "TabulatedAntennaModel",
@@ -1,11 +1,21 @@
-from .generic import Antenna, AntennaModel, ElectricField, MissingFrameError, Voltage
+from .generic import (
+    Antenna,
+    AntennaModel,
+    ElectricField,
+    FFTBackend,
+    MissingFrameError,
+    ProcessingChain,
+    Voltage,
+)
 from .tabulated import TabulatedAntennaModel
 
 __all__ = [
     "Antenna",
     "AntennaModel",
     "ElectricField",
+    "FFTBackend",
     "MissingFrameError",
+    "ProcessingChain",
     "TabulatedAntennaModel",
     "Voltage",
 ]
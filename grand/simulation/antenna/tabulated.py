@@ -1,15 +1,22 @@
 from __future__ import annotations
 
-from dataclasses import dataclass, fields
+from collections import OrderedDict
+from dataclasses import dataclass, field, fields
+import hashlib
 from logging import getLogger
+import os
 from pathlib import Path
-from typing import Union, cast
+import shutil
+import sqlite3
+import threading
+from typing import Mapping, Optional, Tuple, Union, cast
 from numbers import Number
 
 import numpy
 
 from .generic import AntennaModel
 from ... import io
+from ..._core import ffi, lib
 
 from ...tools.coordinates import CartesianRepresentation, SphericalRepresentation
 
@@ -18,6 +25,24 @@ __all__ = ["DataTable", "TabulatedAntennaModel"]
 
 _logger = getLogger(__name__)
 
+_GRIDS_NBYTES = 256 << 20
+"""Maximum size, in bytes, of the frequency grids cached per antenna model"""
+
+_CACHEDIR: Optional[Path] = None
+"""Location of converted antenna models, defaults to GRAND_DATA/antenna"""
+
+_CHUNK_SIZE = 1 << 20
+"""Size of the data chunks read when hashing source files"""
+
+_DIGESTS = """
+CREATE TABLE IF NOT EXISTS digests (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime INTEGER NOT NULL,
+    digest TEXT NOT NULL
+)
+"""
+
 
 @dataclass
 class DataTable:
@@ -43,22 +68,319 @@ class DataTable:
         return DataTable(**data)
 
 
+def _resampling(xp: numpy.ndarray, x: numpy.ndarray) -> Tuple[numpy.ndarray, numpy.ndarray]:
+    """Get the indices and weights for the linear interpolation of a function
+    tabulated at *xp* onto *x*. Weights vanish outside of *xp* range."""
+    j = numpy.clip(numpy.searchsorted(xp, x, side="right"), 1, xp.size - 1)
+    w1 = (x - xp[j - 1]) / (xp[j] - xp[j - 1])
+    inside = (x >= xp[0]) & (x <= xp[-1])
+    return j, numpy.stack((numpy.where(inside, 1 - w1, 0), numpy.where(inside, w1, 0)))
+
+
+def _digest(path: Path) -> str:
+    """Compute a hash of the content of a file"""
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        while True:
+            data = f.read(_CHUNK_SIZE)
+            if not data:
+                break
+            h.update(data)
+    return h.hexdigest()[:16]
+
+
+def _cached_digest(cachedir: Path, path: Path) -> str:
+    """Get the hash of the content of a file, memoized in an SQLite index of
+    the cache directory. The file is hashed again only if its size or its
+    modification time has changed. The index is optional, e.g. for a read-only
+    file system."""
+    path = path.resolve()
+    stat = path.stat()
+    key = (str(path), stat.st_size, stat.st_mtime_ns)
+
+    try:
+        cachedir.mkdir(parents=True, exist_ok=True)
+        db = sqlite3.connect(str(cachedir / "digests.sqlite"), timeout=60)
+    except (OSError, sqlite3.Error):
+        return _digest(path)
+
+    try:
+        try:
+            with db:
+                db.execute(_DIGESTS)
+                row = db.execute(
+                    "SELECT digest FROM digests WHERE path = ? AND size = ? AND mtime = ?", key
+                ).fetchone()
+        except sqlite3.Error:
+            return _digest(path)
+        if row is not None:
+            return row[0]
+
+        digest = _digest(path)
+        try:
+            with db:
+                db.execute("INSERT OR REPLACE INTO digests VALUES (?, ?, ?, ?)", key + (digest,))
+        except sqlite3.Error:
+            pass
+        return digest
+    finally:
+        db.close()
+
+
+def _cache_path(path: Path) -> Path:
+    """Get the location of the converted model for a source file. It is keyed
+    by the file name and by a hash of its content. Thus, touching or moving a
+    file does not invalidate its converted model, while modified files are
+    always converted again."""
+    cachedir = _CACHEDIR
+    if cachedir is None:
+        # Lazy import in order to avoid a circular reference
+        from ... import GRAND_DATA
+
+        cachedir = Path(GRAND_DATA) / "antenna"
+
+    return cachedir / f"{path.stem}.{_cached_digest(cachedir, path)}"
+
+
 @dataclass
 class TabulatedAntennaModel(AntennaModel):
+    """Antenna model tabulated in (frequency, phi, theta).
+
+    Multi-arm models have named *arms*. Their table data carry a leading arm
+    axis, and their Cartesian effective length is stacked as (arm, component)
+    along the first axis, such that all arms are interpolated at once.
+
+    The complex effective length is computed from the table, unless it is
+    provided, e.g. as a memory mapped array of a converted model.
+    """
+
     table: DataTable
+    arms: Optional[Tuple[str, ...]] = None
+    leff_cartesian: Optional[numpy.ndarray] = field(default=None, repr=False, compare=False)
+    _grids: OrderedDict = field(init=False, repr=False, compare=False)
+    _grids_nbytes: int = field(init=False, repr=False, compare=False)
+    _lock: threading.Lock = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        t = self.table
+        if self.arms is not None:
+            self.arms = tuple(self.arms)
+            if (t.leff_theta.ndim != 4) or (t.leff_theta.shape[0] != len(self.arms)):
+                raise ValueError(f"inconsistent table shape for arms {self.arms}")
+
+        self._grids, self._grids_nbytes = OrderedDict(), 0
+        self._lock = threading.Lock()
+
+        if self.leff_cartesian is not None:
+            return
+
+        # Precompute the complex effective length, in Cartesian coordinates,
+        # with shape (component, f, phi, theta)
+        lt = t.leff_theta * numpy.exp(1j * numpy.deg2rad(t.phase_theta))
+        lp = t.leff_phi * numpy.exp(1j * numpy.deg2rad(t.phase_phi))
+
+        theta, phi = numpy.deg2rad(t.theta), numpy.deg2rad(t.phi)
+        ct, st = numpy.cos(theta)[None, :], numpy.sin(theta)[None, :]
+        cp, sp = numpy.cos(phi)[:, None], numpy.sin(phi)[:, None]
+        cartesian = numpy.stack((lt * ct * cp - sp * lp, lt * ct * sp + cp * lp, -st * lt))
+        if self.arms is not None:
+            cartesian = numpy.swapaxes(cartesian, 0, 1).reshape(-1, *cartesian.shape[2:])
+        self.leff_cartesian = cartesian.astype(numpy.complex64)
+
+    def _interpolate(
+        self,
+        v: numpy.ndarray,
+        theta: numpy.ndarray,
+        phi: numpy.ndarray,
+        frequency: Optional[numpy.ndarray] = None,
+        out: Optional[numpy.ndarray] = None,
+    ) -> numpy.ndarray:
+        """Interpolate a complex (component, f, phi, theta) table for
+        directions given by (*theta*, *phi*) in deg, using the compiled
+        kernel.
+
+        If *frequency* is None, the table frequencies are used, i.e. only the
+        direction is interpolated. The result has shape (direction, component,
+        frequency). It is written to *out*, if provided.
+        """
+        t = self.table
+        v = numpy.require(v, numpy.complex64, "C")
+        xp = numpy.require(t.frequency, "f4", "C")
+        theta = numpy.require(numpy.ravel(theta), "f8", "C")
+        phi = numpy.require(numpy.ravel(phi), "f8", "C")
+        if frequency is None:
+            m = v.shape[1]
+        else:
+            frequency = numpy.require(numpy.ravel(frequency), "f8", "C")
+            m = frequency.size
+
+        shape = (theta.size, v.shape[0], m)
+        if out is None:
+            out = numpy.empty(shape, dtype=numpy.complex64)
+        elif (
+            (out.shape != shape)
+            or (out.dtype != numpy.complex64)
+            or not out.flags.c_contiguous
+        ):
+            raise ValueError(f"out must be a contiguous complex64 array of shape {shape}")
+
+        def ptr(a, ctype="double"):
+            return ffi.cast(f"{ctype} *", a.ctypes.data)
+
+        rc = lib.grand_antenna_effective_length(
+            ptr(v, "float"),
+            v.shape[0],
+            v.shape[1],
+            v.shape[2],
+            v.shape[3],
+            ptr(xp, "float"),
+            float(t.phi[0]),
+            float(t.phi[1] - t.phi[0]),
+            float(t.theta[0]),
+            float(t.theta[1] - t.theta[0]),
+            ptr(phi),
+            ptr(theta),
+            theta.size,
+            ffi.NULL if frequency is None else ptr(frequency),
+            m,
+            ptr(out, "float"),
+        )
+        if rc != 0:
+            raise MemoryError()
+
+        return out
+
+    def effective_lengths(
+        self,
+        theta: numpy.ndarray,
+        phi: numpy.ndarray,
+        frequency: numpy.ndarray,
+        out: Optional[numpy.ndarray] = None,
+    ) -> numpy.ndarray:
+        """Interpolate the effective length, in Cartesian coordinates of the
+        antenna frame, for many directions at once.
+
+        Directions are given by arrays of (*theta*, *phi*) angles, in deg. The
+        result is a complex64 array of shape (direction, 3, frequency.size).
+        It vanishes outside of the tabulated frequencies. It is written to
+        *out*, if provided.
+        """
+        return self._interpolate(self.leff_cartesian, theta, phi, frequency, out)
+
+    def _effective_length(
+        self, theta: float, phi: float, frequency: numpy.ndarray
+    ) -> numpy.ndarray:
+        """Interpolate the effective length, in Cartesian coordinates, for a
+        single direction. The result has shape (3, frequency.size)."""
+        return self.effective_lengths(theta, phi, frequency)[0]
+
+    def _resampled(self, n: int, dt: float) -> Tuple[slice, numpy.ndarray]:
+        """Get the Cartesian table resampled onto the frequency grid
+        fftfreq(*n*, *dt*).
+
+        Only the band of grid frequencies overlapping the table is stored, as
+        a (slice, table) pair. Results are cached, keyed by (*n*, *dt*). The
+        least recently used ones are evicted when the cache exceeds
+        _GRIDS_NBYTES. Tables larger than the whole cache are not cached.
+        """
+        key = (n, dt)
+        with self._lock:
+            try:
+                self._grids.move_to_end(key)
+                return self._grids[key]
+            except KeyError:
+                pass
+
+        frequency = numpy.fft.fftfreq(n, dt)
+        j, w = _resampling(self.table.frequency, frequency)
+        inside = numpy.flatnonzero(w.any(axis=0))
+        if inside.size:
+            band = slice(inside[0], inside[-1] + 1)
+        else:
+            band = slice(0, 0)
+        j, w = j[band], w[:, band, None, None]
+        v = self.leff_cartesian
+        resampled = (v[:, j - 1] * w[0] + v[:, j] * w[1]).astype(numpy.complex64, order="C")
+
+        if resampled.nbytes > _GRIDS_NBYTES:
+            return band, resampled
+
+        with self._lock:
+            if key in self._grids:
+                # Another thread has resampled the same grid meanwhile
+                self._grids.move_to_end(key)
+            else:
+                self._grids[key] = band, resampled
+                self._grids_nbytes += resampled.nbytes
+            while self._grids_nbytes > _GRIDS_NBYTES:
+                _, (_, evicted) = self._grids.popitem(last=False)
+                self._grids_nbytes -= evicted.nbytes
+            return self._grids[key]
+
+    def _effective_lengths_on_grid(
+        self, theta: numpy.ndarray, phi: numpy.ndarray, n: int, dt: float
+    ) -> numpy.ndarray:
+        """Interpolate the effective length, in Cartesian coordinates, over
+        the frequency grid fftfreq(*n*, *dt*), for many directions. The result
+        has shape (direction, 3, n)."""
+        band, resampled = self._resampled(n, dt)
+        leff = numpy.zeros((numpy.size(theta), resampled.shape[0], n), dtype=numpy.complex64)
+        leff[:, :, band] = self._interpolate(resampled, theta, phi)
+        return leff
+
+    def _effective_length_on_grid(
+        self, theta: float, phi: float, n: int, dt: float
+    ) -> numpy.ndarray:
+        """Interpolate the effective length, in Cartesian coordinates, over
+        the frequency grid fftfreq(*n*, *dt*). The result has shape (3, n)."""
+        return self._effective_lengths_on_grid(theta, phi, n, dt)[0]
+
+    @classmethod
+    def stack(cls, models: Mapping[str, TabulatedAntennaModel]) -> TabulatedAntennaModel:
+        """Stack single-arm models, given by arm name, into a multi-arm model.
+        All models must share the same (frequency, theta, phi) grid."""
+        arms = tuple(models)
+        tables = [model.table for model in models.values()]
+        if not tables:
+            raise ValueError("no antenna arm")
+
+        data = {}
+        for name in ("frequency", "theta", "phi"):
+            data[name] = getattr(tables[0], name)
+            for table in tables[1:]:
+                if not numpy.array_equal(getattr(table, name), data[name]):
+                    raise ValueError(f"inconsistent {name} grids")
+        for f in fields(DataTable):
+            if f.name not in data:
+                data[f.name] = numpy.stack([getattr(table, f.name) for table in tables])
+
+        return cls(table=DataTable(**data), arms=arms)
+
+    def _dump(self, node: io.DataNode) -> None:
+        self.table.dump(node)
+        if self.arms is not None:
+            node.write("arms", ",".join(self.arms))
 
     def dump(self, destination: Union[str, Path, io.DataNode]) -> None:
         if type(destination) == io.DataNode:
             node = cast(io.DataNode, destination)
-            self.table.dump(node)
+            self._dump(node)
         else:
             path = cast(Union[Path, str], destination)
             with io.open(path, "w") as node:
-                self.table.dump(node)
+                self._dump(node)
 
     @classmethod
     def load(cls, source: Union[str, Path, io.DataNode]) -> TabulatedAntennaModel:
+        """Load a tabulated antenna model.
+
+        Models loaded from files are converted once to an on-disk format,
+        under GRAND_DATA/antenna. Converted models are memory mapped on
+        subsequent loads, such that processes on a node share a single copy
+        of the tables.
+        """
 
+        cache = None
         if type(source) == io.DataNode:
             source = cast(io.DataNode, source)
             filename = f"{source.filename}:{source.path}"
@@ -67,7 +389,11 @@ class TabulatedAntennaModel(AntennaModel):
             source = cast(Union[Path, str], source)
             filename = f"{source}:/"
             source = Path(source)
-            if source.suffix == ".npy":
+            cache = _cache_path(source)
+            if cache.is_dir():
+                loader = "_load_from_cache"
+                source, cache = cache, None
+            elif source.suffix == ".npy":
                 loader = "_load_from_numpy"
             else:
                 loader = "_load_from_datafile"
@@ -76,6 +402,8 @@ class TabulatedAntennaModel(AntennaModel):
 
         load = getattr(cls, loader)
         self = load(source)
+        if cache is not None:
+            self._dump_to_cache(cache)
 
         t = self.table
         n = t.frequency.size * t.theta.size * t.phi.size
@@ -83,6 +411,35 @@ class TabulatedAntennaModel(AntennaModel):
 
         return self
 
+    @classmethod
+    def _load_from_cache(cls, path: Path) -> TabulatedAntennaModel:
+        def read(name):
+            return numpy.load(path / f"{name}.npy", mmap_mode="r")
+
+        table = DataTable(**{f.name: read(f.name) for f in fields(DataTable)})
+        try:
+            arms: Optional[Tuple[str, ...]] = tuple(str(arm) for arm in read("arms"))
+        except FileNotFoundError:
+            arms = None
+        return cls(table, arms, read("leff_cartesian"))
+
+    def _dump_to_cache(self, path: Path) -> None:
+        """Write the converted model to the cache, as one .npy file per table"""
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.part")
+        try:
+            tmp.mkdir(parents=True, exist_ok=True)
+            data = {f.name: getattr(self.table, f.name) for f in fields(DataTable)}
+            data["leff_cartesian"] = self.leff_cartesian
+            if self.arms is not None:
+                data["arms"] = numpy.array(self.arms)
+            for name, value in data.items():
+                numpy.save(tmp / f"{name}.npy", numpy.ascontiguousarray(value))
+            os.rename(tmp, path)
+        except OSError:
+            # The cache is optional, e.g. for a read-only file system, or if
+            # another process has already converted the same model
+            shutil.rmtree(tmp, ignore_errors=True)
+
     @classmethod
     def _load_from_datafile(cls, path: Union[Path, str]) -> TabulatedAntennaModel:
 
@@ -91,7 +448,15 @@ class TabulatedAntennaModel(AntennaModel):
 
     @classmethod
     def _load_from_node(cls, node: io.DataNode) -> TabulatedAntennaModel:
-        return cls(table=DataTable.load(node))
+        try:
+            names = node.read("arms")
+        except KeyError:
+            arms = None
+        else:
+            if isinstance(names, bytes):
+                names = names.decode()
+            arms = tuple(names.split(","))
+        return cls(table=DataTable.load(node), arms=arms)
 
     @classmethod
     def _load_from_numpy(cls, path: Union[Path, str]) -> TabulatedAntennaModel:
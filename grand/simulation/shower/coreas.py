@@ -2,11 +2,12 @@ from __future__ import annotations
 
 from collections import OrderedDict
 from datetime import datetime
+from functools import partial
 from logging import getLogger
 import os
 from pathlib import Path
 import re
-from typing import Dict, Optional, List
+from typing import Dict, Optional, List, Tuple, Union
 
 # import astropy.constants
 # from astropy.coordinates import CartesianRepresentation,                       \
@@ -18,9 +19,11 @@ from grand import CartesianRepresentation, SphericalRepresentation
 import numpy
 
 from .generic import CollectionEntry, FieldsCollection, ShowerEvent
+from .generic import _read_trace, _Selection
 from ..antenna import ElectricField
 from ..pdg import ParticleCode
 from ...tools.coordinates import ECEF, LTP
+from ...tools.sampling import TimeAxis
 
 __all__ = ["CoreasShower"]
 
@@ -45,7 +48,9 @@ class CoreasShower(ShowerEvent):
         return True
 
     @classmethod
-    def _from_dir(cls, path: Path) -> CoreasShower:
+    def _from_dir(
+        cls, path: Path, lazy: bool = False, selection: _Selection = _Selection()
+    ) -> CoreasShower:
         if not path.exists():
             raise FileNotFoundError(path)
 
@@ -111,35 +116,60 @@ class CoreasShower(ShowerEvent):
                 positions[antenna] = CartesianRepresentation(x=r[0], y=r[1], z=r[2])
 
         fields: Optional[FieldsCollection] = None
-        raw_fields = {}
         try:
             fields_path = path.glob("*_coreas").__next__()
         except StopIteration:
             pass
         else:
-            # cgs2si = (astropy.constants.c / (u.m / u.s)).value * 1E+02 * u.uV / u.m
-            cgs2si = 29979245800.0
             pattern = re.compile("(\d+).dat$")
+            paths = {}
             for antenna_path in fields_path.glob("*.dat"):
                 antenna = int(pattern.search(str(antenna_path))[1])  # type: ignore[index]
-                logger.debug(f"Loading trace for antenna {antenna}")
-                data = numpy.loadtxt(antenna_path)
-                t = data[:, 0] * 1e09  # * u.ns
-                Ex = data[:, 1] * cgs2si
-                Ey = data[:, 2] * cgs2si
-                Ez = data[:, 3] * cgs2si
-                electric = ElectricField(
-                    t, CartesianRepresentation(x=Ex, y=Ey, z=Ez), positions[antenna]
-                )
-                raw_fields[antenna] = CollectionEntry(electric)
+                paths[antenna] = antenna_path
 
             fields = FieldsCollection()
-            for key in sorted(raw_fields.keys()):
-                fields[key] = raw_fields[key]
+            for antenna in selection.select(sorted(paths.keys()), positions.get):
+                loader = partial(
+                    cls._load_trace,
+                    antenna,
+                    paths[antenna],
+                    positions[antenna],
+                    selection.time_window,
+                    selection.dtype,
+                    selection.compress,
+                )
+                if lazy:
+                    fields.defer(antenna, loader)
+                else:
+                    fields[antenna] = loader()
 
         ret = cls(fields=fields, **config)  # type: ignore[arg-type]
         return ret
 
+    @staticmethod
+    def _load_trace(
+        antenna: int,
+        path: Path,
+        r: Optional[CartesianRepresentation],
+        time_window: Optional[Tuple[float, float]] = None,
+        dtype: Union[numpy.dtype, str] = "f8",
+        compress: bool = False,
+    ) -> CollectionEntry:
+        """Load the electric field of an antenna from a trace file, within a
+        *time_window* [s], as *dtype* values. Note that loaded times are in
+        ns. They are compressed to a TimeAxis if *compress* is true and if
+        they are regular."""
+        logger.debug(f"Loading trace for antenna {antenna}")
+        # cgs2si = (astropy.constants.c / (u.m / u.s)).value * 1E+02 * u.uV / u.m
+        cgs2si = 29979245800.0
+        data = _read_trace(path, 1, time_window)  # file times are in s
+        t = data[:, 0] * 1e09  # * u.ns
+        if compress:
+            t = TimeAxis.compress(t)
+        E = numpy.ascontiguousarray(data[:, 1:].T * cgs2si, dtype)  # Ex, Ey, Ez
+        electric = ElectricField(t, E.view(CartesianRepresentation), r)
+        return CollectionEntry(electric)
+
     @classmethod
     def _parse_reas(cls, path: Path, index: int) -> Optional[Dict]:
         """Parse a SIMxxxxxx.reas file"""
@@ -1,18 +1,42 @@
 from __future__ import annotations
 
-from collections import OrderedDict
 from dataclasses import dataclass, fields
+from functools import partial
 from logging import getLogger
 from pathlib import Path
-from typing import cast, MutableMapping, Optional, Union
+from types import MappingProxyType
+from typing import (
+    cast,
+    Callable,
+    Collection,
+    Dict,
+    Iterable,
+    List,
+    Mapping,
+    MutableMapping,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
 from datetime import datetime
 from time import time
 from numbers import Number
 import numpy
 
 from ..pdg import ParticleCode
-from ..antenna import ElectricField, Voltage
+from ..antenna import (
+    ElectricField,
+    FFTBackend,
+    MissingFrameError,
+    ProcessingChain,
+    TabulatedAntennaModel,
+    Voltage,
+)
+from ..antenna.generic import _DEFAULT_CHAIN, _DEFAULT_FFT, _voltage
 from ... import io
+from ...tools.sampling import TimeAxis
 from ...tools.coordinates import (
     ECEF,
     Geodetic,
@@ -20,6 +44,7 @@ from ...tools.coordinates import (
     Rotation,
     GRANDCS,
     CartesianRepresentation,
+    SphericalRepresentation,
 )  # RK
 
 __all__ = ["CollectionEntry", "FieldsCollection", "ShowerEvent"]
@@ -34,20 +59,25 @@ class CollectionEntry:
     voltage: Optional[Voltage] = None
 
     @classmethod
-    def load(cls, node: io.DataNode) -> CollectionEntry:
+    def load(
+        cls,
+        node: io.DataNode,
+        time_window: Optional[Tuple[float, float]] = None,
+        dtype: Union[numpy.dtype, str] = "f8",
+    ) -> CollectionEntry:
         try:
             subnode = node["electric"]
         except KeyError:
             electric = None
         else:
-            electric = ElectricField.load(subnode)
+            electric = ElectricField.load(subnode, dtype, time_window)
 
         try:
             subnode = node["voltage"]
         except KeyError:
             voltage = None
         else:
-            voltage = Voltage.load(node)
+            voltage = Voltage.load(subnode, dtype, time_window)
 
         return cls(electric, voltage)
 
@@ -58,8 +88,388 @@ class CollectionEntry:
             self.voltage.dump(node.branch("voltage"))
 
 
-class FieldsCollection(OrderedDict, MutableMapping[int, CollectionEntry]):
-    pass
+class _CollectionRow(CollectionEntry):
+    """A row of a FieldsCollection, viewed as a CollectionEntry"""
+
+    def __init__(self, collection: FieldsCollection, antenna: int) -> None:
+        self._collection = collection
+        self._antenna = antenna
+
+    @property  # type: ignore[override]
+    def electric(self) -> Optional[ElectricField]:
+        collection = self._collection
+        return collection._get_electric(collection._load(self._antenna))
+
+    @electric.setter
+    def electric(self, electric: Optional[ElectricField]) -> None:
+        collection = self._collection
+        collection._set_electric(collection._load(self._antenna), electric)
+
+    @property  # type: ignore[override]
+    def voltage(self) -> Optional[Voltage]:
+        collection = self._collection
+        return collection._get_voltage(collection._load(self._antenna))
+
+    @voltage.setter
+    def voltage(self, voltage: Optional[Voltage]) -> None:
+        collection = self._collection
+        collection._set_voltage(collection._load(self._antenna), voltage)
+
+
+def _resize(a: numpy.ndarray, capacity: int, axis: int = 0) -> numpy.ndarray:
+    """Resize the storage of a column, along *axis*"""
+    shape = list(a.shape)
+    n, shape[axis] = shape[axis], capacity
+    b = numpy.zeros(shape, a.dtype)
+    b[(slice(None),) * axis + (slice(0, n),)] = a
+    return b
+
+
+def _load_entry(
+    filename: str,
+    path: str,
+    time_window: Optional[Tuple[float, float]] = None,
+    dtype: Union[numpy.dtype, str] = "f8",
+) -> CollectionEntry:
+    """Load the entry of an antenna from a data file"""
+    with io.open(filename) as root:
+        return CollectionEntry.load(root[path], time_window, dtype)
+
+
+class _Selection(NamedTuple):
+    """Selection of antennas and of samples, applied when loading fields,
+    the type of the loaded field values, and whether regular times of
+    simulation traces are compressed to a TimeAxis"""
+
+    antennas: Optional[Collection[int]] = None
+    region: Optional[Callable[[numpy.ndarray], numpy.ndarray]] = None
+    time_window: Optional[Tuple[float, float]] = None
+    dtype: Union[numpy.dtype, str] = "f8"
+    compress: bool = False
+
+    def select(
+        self, antennas: Iterable[int], position: Callable[[int], Optional[numpy.ndarray]]
+    ) -> List[int]:
+        """Select *antennas*, preserving their order. The *position* of an
+        antenna is only requested if a region is selected. Antennas with an
+        unknown position are outside of any region."""
+        selected = list(antennas)
+        if self.antennas is not None:
+            numbers = set(self.antennas)
+            selected = [a for a in selected if a in numbers]
+
+        if self.region is not None:
+            positions = {a: position(a) for a in selected}
+            selected = [a for a in selected if positions[a] is not None]
+            if selected:
+                r = numpy.stack([numpy.ravel(positions[a]) for a in selected], axis=1)
+                inside = numpy.asarray(self.region(r), dtype=bool).reshape(-1)
+                selected = [a for a, keep in zip(selected, inside) if keep]
+
+        return selected
+
+
+def _read_trace(
+    path: Path, scale: float = 1, time_window: Optional[Tuple[float, float]] = None
+) -> numpy.ndarray:
+    """Read a text trace file, with times and the 3 components of the field
+    as columns. If a *time_window* is given, only the rows with times (times
+    *scale*) within the window are parsed, and the file is read up to the end
+    of the window."""
+    if time_window is None:
+        return numpy.loadtxt(path, ndmin=2)
+
+    t_min, t_max = time_window
+    rows = []
+    with open(path) as f:
+        for line in f:
+            words = line.split(None, 1)
+            if (not words) or words[0].startswith("#"):
+                continue
+            t = float(words[0]) * scale
+            if t > t_max:
+                break
+            elif t >= t_min:
+                rows.append(line)
+
+    return numpy.loadtxt(rows, ndmin=2) if rows else numpy.empty((0, 4))
+
+
+class FieldsCollection(MutableMapping[int, CollectionEntry]):
+    """Electric fields and voltages of a shower event, by antenna number.
+
+    Traces are stored by column, in contiguous arrays: electric fields as an
+    (antenna, 3, sample) array E, antenna positions as a (3, antenna) array r,
+    with NaN values if unknown, and voltages as an (antenna, [arm,] sample)
+    array V. Shorter traces are zero padded. Rows follow the insertion order
+    of antennas. The index maps antenna numbers to rows.
+
+    Items are CollectionEntry views of a row. Their arrays share the storage
+    of the collection, until it grows. Setting their electric field or their
+    voltage updates the collection.
+
+    Entries can also be deferred, i.e. loaded on first access of their row.
+    Accessing the E, r or V columns loads all deferred entries.
+    """
+
+    def __init__(
+        self,
+        entries: Union[Mapping[int, CollectionEntry], Sequence[Tuple[int, CollectionEntry]], None] = None,
+    ) -> None:
+        self._index: Dict[int, int] = {}
+        self._antennas = numpy.empty(0, dtype="i8")
+        self._r = numpy.empty((3, 0))
+        self._E: Optional[numpy.ndarray] = None
+        self._V: Optional[numpy.ndarray] = None
+        self._t: List[Union[numpy.ndarray, TimeAxis, None]] = []
+        self._frames: List[Union[ECEF, LTP, GRANDCS, None]] = []
+        self._n: List[int] = []  # number of samples of electric fields, -1 if unset
+        self._tv: List[Union[numpy.ndarray, TimeAxis, None]] = []
+        self._nv: List[int] = []  # number of samples of voltages, -1 if unset
+        self._loaders: Dict[int, Callable[[], CollectionEntry]] = {}
+
+        if entries is not None:
+            self.update(entries)
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}(antennas={self.antennas.tolist()})"
+
+    def __len__(self) -> int:
+        return len(self._t)
+
+    def __iter__(self):
+        return iter(self.antennas.tolist())
+
+    def __contains__(self, antenna) -> bool:
+        return antenna in self._index
+
+    def __getitem__(self, antenna: int) -> CollectionEntry:
+        if antenna not in self._index:
+            raise KeyError(antenna)
+        return _CollectionRow(self, antenna)
+
+    def __setitem__(self, antenna: int, entry: CollectionEntry) -> None:
+        try:
+            row = self._index[antenna]
+        except KeyError:
+            row = self._append(antenna)
+            try:
+                self._set_entry(row, entry.electric, entry.voltage)
+            except Exception:
+                del self[antenna]
+                raise
+        else:
+            self._set_entry(row, entry.electric, entry.voltage)
+            self._loaders.pop(antenna, None)
+
+    def __delitem__(self, antenna: int) -> None:
+        row = self._index.pop(antenna)
+        self._loaders.pop(antenna, None)
+        n = len(self)
+        for column in (self._antennas, self._E, self._V):
+            if column is not None:
+                column[row : n - 1] = column[row + 1 : n]
+                column[n - 1] = 0
+        self._r[:, row : n - 1] = self._r[:, row + 1 : n]
+        self._r[:, n - 1] = numpy.nan
+        for values in (self._t, self._frames, self._n, self._tv, self._nv):
+            del values[row]
+        for i in range(row, n - 1):
+            self._index[int(self._antennas[i])] = i
+
+    @property
+    def antennas(self) -> numpy.ndarray:
+        """Antenna numbers, by row"""
+        return self._antennas[: len(self)]
+
+    @property
+    def index(self) -> Mapping[int, int]:
+        """Rows, by antenna number"""
+        return MappingProxyType(self._index)
+
+    @property
+    def E(self) -> Optional[numpy.ndarray]:
+        """Electric fields, as an (antenna, 3, sample) array"""
+        self._load_all()
+        return None if self._E is None else self._E[: len(self)]
+
+    @property
+    def r(self) -> numpy.ndarray:
+        """Antenna positions, as a (3, antenna) array"""
+        self._load_all()
+        return self._r[:, : len(self)]
+
+    @property
+    def V(self) -> Optional[numpy.ndarray]:
+        """Voltages, as an (antenna, [arm,] sample) array"""
+        self._load_all()
+        return None if self._V is None else self._V[: len(self)]
+
+    def defer(self, antenna: int, loader: Callable[[], CollectionEntry]) -> None:
+        """Add the entry of an *antenna*, which is loaded on first access by
+        calling *loader*"""
+        try:
+            row = self._index[antenna]
+        except KeyError:
+            self._append(antenna)
+        else:
+            self._set_electric(row, None)
+            self._set_voltage(row, None)
+        self._loaders[antenna] = loader
+
+    @property
+    def deferred(self) -> List[int]:
+        """Antennas whose entry has not been loaded yet"""
+        return list(self._loaders)
+
+    def _load(self, antenna: int) -> int:
+        """Load the entry of an *antenna*, if deferred, and return its row"""
+        row = self._index[antenna]
+        loader = self._loaders.get(antenna)
+        if loader is not None:
+            entry = loader()
+            self._set_entry(row, entry.electric, entry.voltage)
+            del self._loaders[antenna]
+        return row
+
+    def _load_all(self) -> None:
+        for antenna in list(self._loaders):
+            self._load(antenna)
+
+    def _append(self, antenna: int) -> int:
+        row = len(self)
+        if row == self._antennas.size:
+            capacity = max(8, 2 * row)
+            self._antennas = _resize(self._antennas, capacity)
+            self._r = _resize(self._r, capacity, axis=1)
+            if self._E is not None:
+                self._E = _resize(self._E, capacity)
+            if self._V is not None:
+                self._V = _resize(self._V, capacity)
+
+        self._antennas[row] = antenna
+        self._r[:, row] = numpy.nan
+        for column in (self._E, self._V):
+            if column is not None:
+                column[row] = 0
+        self._index[antenna] = row
+        for values in (self._t, self._frames, self._tv):
+            values.append(None)
+        self._n.append(-1)
+        self._nv.append(-1)
+        return row
+
+    def _check(
+        self, name: str, counts: List[int], rows: Sequence[int], shape: Tuple[int, ...]
+    ) -> bool:
+        """Check that *rows* of the traces column *name* can be set with
+        traces of *shape*. Rows with a negative count are unset. Return True
+        if other rows are set, i.e. if the storage must be kept."""
+        column = getattr(self, name)
+        if column is None:
+            return False
+        others = set(i for i, n in enumerate(counts) if n >= 0) - set(rows)
+        if others and (column.shape[1:-1] != tuple(shape[:-1])):
+            raise ValueError(
+                f"inconsistent trace shape (expected {column.shape[1:-1]}, got {shape[:-1]})"
+            )
+        return bool(others)
+
+    def _column(
+        self,
+        name: str,
+        counts: List[int],
+        rows: Sequence[int],
+        shape: Tuple[int, ...],
+        dtype: numpy.dtype,
+    ) -> numpy.ndarray:
+        """Get the storage of the traces column *name*, for setting *rows*
+        with traces of *shape* and *dtype*. Rows with a negative count are
+        unset."""
+        column = getattr(self, name)
+        if not self._check(name, counts, rows, shape):
+            # All traces are replaced, thus the storage can be as well
+            column = None
+
+        if column is None:
+            column = numpy.zeros((self._antennas.size,) + shape, dtype)
+        else:
+            n = max(column.shape[-1], shape[-1])
+            dtype = numpy.result_type(column.dtype, dtype)
+            if (n > column.shape[-1]) or (dtype != column.dtype):
+                tmp = numpy.zeros(column.shape[:-1] + (n,), dtype)
+                tmp[..., : column.shape[-1]] = column
+                column = tmp
+            else:
+                return column
+        setattr(self, name, column)
+        return column
+
+    def _set_entry(
+        self, row: int, electric: Optional[ElectricField], voltage: Optional[Voltage]
+    ) -> None:
+        """Set the electric field and the voltage of a row. Both are checked
+        before any column is modified."""
+        if electric is not None:
+            self._check("_E", self._n, (row,), numpy.shape(electric.E))
+        if voltage is not None:
+            self._check("_V", self._nv, (row,), numpy.shape(voltage.V))
+        self._set_electric(row, electric)
+        self._set_voltage(row, voltage)
+
+    def _get_electric(self, row: int) -> Optional[ElectricField]:
+        n = self._n[row]
+        if n < 0:
+            return None
+
+        E = self._E[row, :, :n].view(CartesianRepresentation)
+        r = self._r[:, row : row + 1]
+        if numpy.isnan(r).any():
+            r = None
+        else:
+            r = r.view(CartesianRepresentation)
+        return ElectricField(self._t[row], E, r, self._frames[row])
+
+    def _set_electric(self, row: int, electric: Optional[ElectricField]) -> None:
+        if electric is None:
+            self._t[row], self._frames[row], self._n[row] = None, None, -1
+            self._r[:, row] = numpy.nan
+            return
+
+        E = numpy.asarray(electric.E)
+        n = E.shape[-1]
+        column = self._column("_E", self._n, (row,), E.shape, E.dtype)
+        column[row, :, :n] = E
+        column[row, :, n:] = 0
+        self._t[row], self._frames[row], self._n[row] = electric.t, electric.frame, n
+        if electric.r is None:
+            self._r[:, row] = numpy.nan
+        else:
+            self._r[:, row] = numpy.ravel(electric.r)
+
+    def _get_voltage(self, row: int) -> Optional[Voltage]:
+        n = self._nv[row]
+        return None if n < 0 else Voltage(self._tv[row], self._V[row, ..., :n])
+
+    def _set_voltage(self, row: int, voltage: Optional[Voltage]) -> None:
+        if voltage is None:
+            self._tv[row], self._nv[row] = None, -1
+        else:
+            self._set_voltages([row], [voltage.t], numpy.asarray(voltage.V)[None])
+
+    def _set_voltages(
+        self,
+        rows: Sequence[int],
+        t: Sequence[Union[numpy.ndarray, TimeAxis]],
+        V: numpy.ndarray,
+    ) -> None:
+        """Set the voltages of several *rows* at once"""
+        n = V.shape[-1]
+        column = self._column("_V", self._nv, rows, V.shape[1:], V.dtype)
+        column[rows, ..., :n] = V
+        column[rows, ..., n:] = 0
+        for row, ti in zip(rows, t):
+            self._tv[row], self._nv[row] = ti, n
 
 
 @dataclass
@@ -75,8 +485,42 @@ class ShowerEvent:
     ground_alt: float = 0.0
     fields: Optional[FieldsCollection] = None
 
+    def __post_init__(self) -> None:
+        if (self.fields is not None) and not isinstance(self.fields, FieldsCollection):
+            self.fields = FieldsCollection(self.fields)
+
     @classmethod
-    def load(cls, source: Union[Path, str, io.DataNode]) -> ShowerEvent:
+    def load(
+        cls,
+        source: Union[Path, str, io.DataNode],
+        lazy: bool = False,
+        antennas: Optional[Collection[int]] = None,
+        region: Optional[Callable[[numpy.ndarray], numpy.ndarray]] = None,
+        time_window: Optional[Tuple[float, float]] = None,
+        dtype: Union[numpy.dtype, str] = "f8",
+        compress: bool = False,
+    ) -> ShowerEvent:
+        """Load a shower event from a data file, from a data node, or from a
+        simulation directory (CoREAS or ZHAireS).
+
+        If *lazy* is true, the fields of antennas are loaded on first access,
+        e.g. shower.fields[antenna]. The traces are not read at all if only
+        the metadata of the event are used.
+
+        Fields can be restricted to some *antennas* numbers, and to antennas
+        within a *region*. The region is a function of antenna positions, as
+        a (3, antenna) array, returning a boolean mask, e.g.
+        lambda r: numpy.hypot(r[0], r[1]) < 500. Samples can be restricted to
+        a *time_window*, (t_min, t_max), in s whatever the data format. Times
+        of traces in data files are assumed to be in s. Unselected antennas
+        and samples are not read from the data. Antennas without any sample
+        within the window are kept, with empty traces.
+
+        Field values are loaded as *dtype*, e.g. "f4" for single precision.
+        Times are always loaded as f8. If *compress* is true, regularly
+        sampled times of simulation traces (CoREAS or ZHAireS) are loaded as
+        a TimeAxis, see TimeAxis.compress. Otherwise, they are kept as is.
+        """
         baseclass = cls
         if type(source) == io.DataNode:
             source = cast(io.DataNode, source)
@@ -106,12 +550,13 @@ class ShowerEvent:
         # print(f'Loading shower data from {filename}')
         # print('loader', loader)
 
+        selection = _Selection(antennas, region, time_window, dtype, compress)
         try:
             load = getattr(baseclass, loader)
         except AttributeError:
             raise NotImplementedError(f"Invalid data format")
         else:
-            self = load(source)
+            self = load(source, lazy, selection)
 
         if self.fields is not None:
             _logger.info(f"Loaded {len(self.fields)} field(s) from {filename}")
@@ -119,12 +564,16 @@ class ShowerEvent:
         return self
 
     @classmethod
-    def _from_datafile(cls, path: Path) -> ShowerEvent:
+    def _from_datafile(
+        cls, path: Path, lazy: bool = False, selection: _Selection = _Selection()
+    ) -> ShowerEvent:
         with io.open(path) as root:
-            return cls._from_datanode(root)
+            return cls._from_datanode(root, lazy, selection)
 
     @classmethod
-    def _from_datanode(cls, node: io.DataNode) -> ShowerEvent:
+    def _from_datanode(
+        cls, node: io.DataNode, lazy: bool = False, selection: _Selection = _Selection()
+    ) -> ShowerEvent:
         kwargs = {}
         for name, data in node.elements:
             kwargs[name] = data
@@ -134,12 +583,33 @@ class ShowerEvent:
         except KeyError:
             pass
         else:
-            fields: OrderedDict = OrderedDict()
+            fields = FieldsCollection()
             kwargs["fields"] = fields
 
-            for antenna_node in fields_node:
-                antenna = int(antenna_node.name)
-                fields[antenna] = CollectionEntry.load(antenna_node)
+            nodes = {int(antenna_node.name): antenna_node for antenna_node in fields_node}
+
+            def position(antenna: int) -> Optional[numpy.ndarray]:
+                try:
+                    return nodes[antenna]["electric"].read("r")
+                except KeyError:
+                    return None
+
+            time_window, dtype = selection.time_window, selection.dtype
+            for antenna in selection.select(nodes, position):
+                antenna_node = nodes[antenna]
+                if lazy:
+                    # The data file is opened again on access, since this
+                    # node might be closed by then
+                    loader = partial(
+                        _load_entry,
+                        antenna_node.filename,
+                        antenna_node.path,
+                        time_window,
+                        dtype,
+                    )
+                    fields.defer(antenna, loader)
+                else:
+                    fields[antenna] = CollectionEntry.load(antenna_node, time_window, dtype)
 
         return cls(**kwargs)
 
@@ -205,3 +675,89 @@ class ShowerEvent:
         self.frame.basis = numpy.vstack((evB, evvB, ev))
 
         return self.frame
+
+    def compute_voltages(
+        self,
+        model: TabulatedAntennaModel,
+        antenna_frames: Union[Mapping[int, Union[LTP, GRANDCS]], Sequence[Union[LTP, GRANDCS]]],
+        dtype: Union[numpy.dtype, str] = "f8",
+        fft: Optional[FFTBackend] = None,
+        chain: Optional[ProcessingChain] = None,
+    ) -> None:
+        """Compute the voltages of all antennas, at once.
+
+        The antenna frames are given by antenna index, or as a sequence
+        matching the order of the fields. As for Antenna.compute_voltage, the
+        electric field is assumed to be a plane wave originating from the
+        shower maximum, and it is expressed in the shower frame. Traces with
+        the same sampling are stacked, such that arrival directions, effective
+        lengths and FFTs are computed as batched array operations. Voltages
+        are stored in the fields collection. For multi-arm antenna models,
+        voltages have shape (arm, sample), following the order of model arms.
+
+        Computations are done in *dtype* precision, e.g. "f4" for single
+        precision, and FFTs with the *fft* backend. The processing *chain* is
+        applied in the frequency domain, with a single inverse FFT per batch
+        of traces (see Antenna.compute_voltage).
+        """
+        if self.frame is None:
+            raise MissingFrameError("missing shower frame")
+        if not isinstance(self.maximum, LTP):
+            raise TypeError("Provide Xmax in LTP frame instead of %s" % type(self.maximum))
+        if self.fields is None:
+            return
+        if fft is None:
+            fft = _DEFAULT_FFT
+        if chain is None:
+            chain = _DEFAULT_CHAIN
+
+        if isinstance(antenna_frames, Mapping):
+            frames = {a: antenna_frames[a] for a in self.fields if a in antenna_frames}
+        else:
+            if len(antenna_frames) != len(self.fields):
+                raise ValueError(
+                    f"expected {len(self.fields)} antenna frame(s), got {len(antenna_frames)}"
+                )
+            frames = dict(zip(self.fields, antenna_frames))
+
+        # Group antennas by sampling of their traces. Antennas without
+        # electric field, or with less than 2 samples, are skipped
+        fields = self.fields
+        groups: Dict[Tuple[int, float], List[int]] = {}
+        for antenna in frames:
+            row = fields._load(antenna)
+            if fields._n[row] > 1:
+                t = fields._t[row]
+                groups.setdefault((fields._n[row], float(t[1] - t[0])), []).append(antenna)
+
+        # Former voltages are discarded, such that their shape might change
+        for antenna in frames:
+            fields._set_voltage(fields._index[antenna], None)
+
+        xmax = numpy.asarray(ECEF(self.maximum)).reshape(3)
+        for (n, dt), antennas in groups.items():
+            rows = [fields._index[a] for a in antennas]
+
+            # Arrival directions, in antenna frames
+            basis = numpy.stack([frames[a].basis for a in antennas])
+            origin = numpy.stack([numpy.ravel(frames[a].location) for a in antennas])
+            u = numpy.einsum("nij,nj->in", basis, xmax - origin)
+            direction = SphericalRepresentation(CartesianRepresentation(x=u[0], y=u[1], z=u[2]))
+
+            # Effective lengths, rotated from antenna frames to the shower
+            # frame (through ECEF)
+            m = chain.size(n, fft) // 2 + 1  # size of the rfft
+            leff = model._effective_lengths_on_grid(direction.theta, direction.phi, m, dt)
+            leff = leff.reshape(len(antennas), -1, 3, m)  # (antenna, arm, 3, frequency)
+            rotation = numpy.einsum("ij,nkj->nik", self.frame.basis, basis).astype(dtype)
+            # Only the real part of Leff is used, as in Antenna.effective_length
+            leff = numpy.einsum("nij,najf->naif", rotation, leff.real.astype(dtype))
+
+            # Batched voltage computation, straight from the fields columns
+            E = fields._E[rows, :, :n].astype(dtype, copy=False)
+            V = _voltage(E[:, None], leff, fft, chain=chain, dt=dt)
+            if model.arms is None:
+                V = V[:, 0]
+
+            t = [fields._t[row][:: chain.decimation][: V.shape[-1]] for row in rows]
+            fields._set_voltages(rows, t, V)
@@ -1,10 +1,11 @@
 from __future__ import annotations
 
 from datetime import datetime
+from functools import partial
 from logging import getLogger
 from pathlib import Path
 import re
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Optional, Tuple, Union
 
 
 import h5py
@@ -12,9 +13,11 @@ import numpy
 
 
 from .generic import CollectionEntry, FieldsCollection, ShowerEvent
+from .generic import _read_trace, _Selection
 from ..antenna import ElectricField
 from ..pdg import ParticleCode
 from ...tools.coordinates import ECEF, LTP, Geodetic
+from ...tools.sampling import TimeAxis, time_slice
 from ...tools.coordinates import (
     CartesianRepresentation,
     SphericalRepresentation,
@@ -40,7 +43,9 @@ class ZhairesShower(ShowerEvent):
         return True
 
     @classmethod
-    def _from_dir(cls, path: Path) -> ZhairesShower:
+    def _from_dir(
+        cls, path: Path, lazy: bool = False, selection: _Selection = _Selection()
+    ) -> ZhairesShower:
         if not path.exists():
             raise FileNotFoundError(path)
 
@@ -195,35 +200,102 @@ class ZhairesShower(ShowerEvent):
                     # )
 
         fields: Optional[FieldsCollection] = None
-        raw_fields = {}
+        paths = {}
         for field_path in path.glob("a*.trace"):
             # Example field_path => ..../grand/tests/simulation/data/zhaires/a1.trace
-            #                    =>    time [ns]      Ex [uVm]    Ey [uVm]   Ez [uVm]
-            #                    => -1.1463000E+04  -5.723E-05  -1.946E-04  4.324E-04
             antenna = int(field_path.name[1:].split(".", 1)[0])
-            logger.debug(f"Loading trace for antenna {antenna}")
-            data = numpy.loadtxt(field_path)
-            t = data[:, 0] * 1.0e-9  # ns --> s
-            Ex = data[:, 1]  # uVm
-            Ey = data[:, 2]  # uVm
-            Ez = data[:, 3]  # uVm
-            electric = ElectricField(
-                t, CartesianRepresentation(x=Ex, y=Ey, z=Ez), positions[antenna]
-            )
-            raw_fields[antenna] = CollectionEntry(electric)
+            paths[antenna] = field_path
 
-        if raw_fields:
+        if paths:
             fields = FieldsCollection()
-            for key in sorted(raw_fields.keys()):
-                fields[key] = raw_fields[key]
+            for antenna in selection.select(sorted(paths.keys()), positions.get):
+                loader = partial(
+                    cls._load_trace,
+                    antenna,
+                    paths[antenna],
+                    positions[antenna],
+                    selection.time_window,
+                    selection.dtype,
+                    selection.compress,
+                )
+                if lazy:
+                    fields.defer(antenna, loader)
+                else:
+                    fields[antenna] = loader()
 
         return cls(fields=fields, **inp)
 
+    @staticmethod
+    def _load_trace(
+        antenna: int,
+        path: Path,
+        r: Optional[CartesianRepresentation],
+        time_window: Optional[Tuple[float, float]] = None,
+        dtype: Union[numpy.dtype, str] = "f8",
+        compress: bool = False,
+    ) -> CollectionEntry:
+        """Load the electric field of an antenna from a trace file, within a
+        *time_window* [s], as *dtype* values. Regular times are compressed to
+        a TimeAxis if *compress* is true."""
+        #    time [ns]      Ex [uVm]    Ey [uVm]   Ez [uVm]
+        # -1.1463000E+04  -5.723E-05  -1.946E-04  4.324E-04
+        logger.debug(f"Loading trace for antenna {antenna}")
+        data = _read_trace(path, 1.0e-9, time_window)
+        t = data[:, 0] * 1.0e-9  # ns --> s
+        if compress:
+            t = TimeAxis.compress(t)
+        E = numpy.ascontiguousarray(data[:, 1:].T, dtype)  # Ex, Ey, Ez [uVm]
+        electric = ElectricField(t, E.view(CartesianRepresentation), r)
+        return CollectionEntry(electric)
+
     @classmethod
-    def _from_datafile(cls, path: Path):
+    def _load_efield(
+        cls,
+        path: Path,
+        name: str,
+        tag: str,
+        r: CartesianRepresentation,
+        time_window: Optional[Tuple[float, float]] = None,
+        dtype: Union[numpy.dtype, str] = "f8",
+        compress: bool = False,
+    ) -> CollectionEntry:
+        """Load the electric field of an antenna from a ZHAireS HDF5 file"""
+        with h5py.File(path, "r") as fd:
+            dset = fd[f"{name}/AntennaTraces/{tag}/efield"]
+            return cls._parse_efield(dset, r, time_window, dtype, compress)
+
+    @staticmethod
+    def _parse_efield(
+        dset: h5py.Dataset,
+        r: CartesianRepresentation,
+        time_window: Optional[Tuple[float, float]] = None,
+        dtype: Union[numpy.dtype, str] = "f8",
+        compress: bool = False,
+    ) -> CollectionEntry:
+        """Parse the electric field of an antenna from a ZHAireS table, within
+        a *time_window* [s], as *dtype* values. Only the time column and the
+        rows within the window are read. Regular times are compressed to a
+        TimeAxis if *compress* is true."""
+        if time_window is None:
+            tmp = dset[:]
+        else:
+            t = numpy.asarray(dset.fields(dset.dtype.names[0])[:], "f8") * 1.0e-9
+            tmp = dset[time_slice(t, time_window)]
+        efield = tmp.view("f4").reshape(tmp.shape + (tmp.dtype.itemsize // 4,))
+        t = numpy.asarray(efield[:, 0], "f8") * 1.0e-9  # ns --> s
+        if compress:
+            t = TimeAxis.compress(t)
+        E = numpy.ascontiguousarray(efield[:, 1:4].T, dtype)  # Ex, Ey, Ez [uV/m]
+        E = E.view(CartesianRepresentation)
+        return CollectionEntry(electric=ElectricField(t=t, E=E, r=r))
+
+    @classmethod
+    def _from_datafile(
+        cls, path: Path, lazy: bool = False, selection: _Selection = _Selection()
+    ):
         with h5py.File(path, "r") as fd:
             if not "RunInfo.__table_column_meta__" in fd["/"]:
-                return super()._from_datafile(path)
+                return super()._from_datafile(path, lazy, selection)
 
             for name in fd["/"].keys():
                 if not name.startswith("RunInfo"):
@@ -236,19 +308,26 @@ class ZhairesShower(ShowerEvent):
             fields = FieldsCollection()
 
             pattern = re.compile("([0-9]+)$")
+            tags, positions = {}, {}
             for tag, x, y, z, *_ in antennas:
                 tag = tag.decode()
                 # TODO: mypy indicate type error ... disable
                 antenna = int(pattern.search(tag)[1])  # type: ignore[index]
-                r = CartesianRepresentation(x=float(x), y=float(y), z=float(z))  # RK
-                tmp = traces[f"{tag}/efield"][:]
-                efield = tmp.view("f4").reshape(tmp.shape + (-1,))
-                t = numpy.asarray(efield[:, 0], "f8") * 1.0e-9  # ns --> s
-                Ex = numpy.asarray(efield[:, 1], "f8")  # uV/m
-                Ey = numpy.asarray(efield[:, 2], "f8")  # uV/m
-                Ez = numpy.asarray(efield[:, 3], "f8")  # uV/m
-                E = CartesianRepresentation(x=Ex, y=Ey, z=Ez)
-                fields[antenna] = CollectionEntry(electric=ElectricField(t=t, E=E, r=r))
+                tags[antenna] = tag
+                positions[antenna] = CartesianRepresentation(
+                    x=float(x), y=float(y), z=float(z)
+                )  # RK
+
+            options = (selection.time_window, selection.dtype, selection.compress)
+            for antenna in selection.select(tags, positions.get):
+                tag, r = tags[antenna], positions[antenna]
+                if lazy:
+                    # The data file is opened again on access
+                    loader = partial(cls._load_efield, path, name, tag, r, *options)
+                    fields.defer(antenna, loader)
+                else:
+                    efield = traces[f"{tag}/efield"]
+                    fields[antenna] = cls._parse_efield(efield, r, *options)
 
             primary = {
                 "Fe^56": ParticleCode.IRON,
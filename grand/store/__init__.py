@@ -1,6 +1,7 @@
 """Storage for the GRAND package
 """
 
-from .protocol import InvalidBLOB, get
+from .cache import Cache, fetch
+from .protocol import InvalidBLOB, download, get, get_many, stream
 
-__all__ = ["get", "InvalidBLOB"]
+__all__ = ["Cache", "download", "fetch", "get", "get_many", "stream", "InvalidBLOB"]
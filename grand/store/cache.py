@@ -0,0 +1,297 @@
+"""Content-addressed local cache for the GRAND store
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+from pathlib import Path
+import sqlite3
+import threading
+import time
+from typing import List, NamedTuple, Optional, Union
+
+from .protocol import stream
+
+__all__ = ["Cache", "CacheEntry", "fetch"]
+
+
+DEFAULT_BUDGET = 10 * (1 << 30)
+"""Default disk budget of the cache, in bytes"""
+
+_CHUNK_SIZE = 1 << 20
+"""Size of the data chunks read when computing checksums"""
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    name TEXT NOT NULL,
+    tag TEXT NOT NULL,
+    checksum TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    access REAL NOT NULL,
+    verified INTEGER NOT NULL DEFAULT -1,
+    PRIMARY KEY (name, tag)
+);
+CREATE TABLE IF NOT EXISTS pins (
+    name TEXT NOT NULL,
+    tag TEXT NOT NULL,
+    PRIMARY KEY (name, tag)
+)
+"""
+
+_default_cache: Optional[Cache] = None
+"""The default cache, under GRAND_DATA"""
+
+
+class CacheEntry(NamedTuple):
+    """An entry of the cache index"""
+
+    name: str
+    tag: str
+    checksum: str
+    size: int
+    access: float
+
+
+class _HashingWriter:
+    """File-like wrapper computing the checksum of written data"""
+
+    def __init__(self, f):
+        self._f = f
+        self.hash = hashlib.sha256()
+
+    def write(self, data: bytes) -> int:
+        self.hash.update(data)
+        return self._f.write(data)
+
+
+def _checksum(path: Path) -> str:
+    """Compute the checksum of a file"""
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        while True:
+            data = f.read(_CHUNK_SIZE)
+            if not data:
+                break
+            h.update(data)
+    return h.hexdigest()
+
+
+class Cache:
+    """Content-addressed on-disk cache of store BLOBs.
+
+    BLOBs are stored under their SHA-256 checksum, such that identical
+    contents are stored once. An SQLite index maps (name, tag) pairs to
+    checksums, together with the BLOB size and its last access time. The index
+    can safely be shared between several processes.
+
+    BLOBs can be pinned, e.g. if they are linked from outside of the cache.
+    Pinned BLOBs are never evicted, until they are unpinned.
+
+    Checksums are verified lazily, when a BLOB is accessed and its file has
+    changed since its last verification. Corrupted or partial BLOBs are
+    downloaded again. The least recently used BLOBs are evicted whenever the
+    cache size exceeds *budget* bytes.
+    """
+
+    def __init__(self, path: Union[Path, str, None] = None, budget: int = DEFAULT_BUDGET):
+        if path is None:
+            # Lazy import in order to avoid a circular reference
+            from .. import GRAND_DATA
+
+            path = Path(GRAND_DATA) / "store"
+        self._path = Path(path)
+        self._budget = budget
+        self._local = threading.local()
+
+        for directory in (self._path, self._path / "blobs", self._path / "tmp"):
+            directory.mkdir(parents=True, exist_ok=True)
+        with self._connect() as db:
+            db.executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        """Get a connection to the index, for the current thread"""
+        try:
+            return self._local.db
+        except AttributeError:
+            db = sqlite3.connect(str(self._path / "index.sqlite"), timeout=60)
+            self._local.db = db
+            return db
+
+    def _blob_path(self, checksum: str) -> Path:
+        return self._path / "blobs" / checksum[:2] / checksum
+
+    def get(self, name: str, tag: str = "101", pin: bool = False) -> Path:
+        """Get the path to a verified local copy of a BLOB, fetching it from
+        the store if needed. If *pin* is true, the BLOB is also pinned."""
+        db = self._connect()
+        if pin:
+            # Pin first, such that the BLOB cannot be evicted meanwhile
+            self.pin(name, tag)
+        row = db.execute(
+            "SELECT checksum, size, verified FROM blobs WHERE name = ? AND tag = ?",
+            (name, tag),
+        ).fetchone()
+
+        if row is not None:
+            checksum, size, verified = row
+            path = self._blob_path(checksum)
+            if self._check(path, checksum, size, verified):
+                with db:
+                    db.execute(
+                        "UPDATE blobs SET access = ? WHERE name = ? AND tag = ?",
+                        (time.time(), name, tag),
+                    )
+                return path
+
+        return self._fetch(name, tag)
+
+    def _check(self, path: Path, checksum: str, size: int, verified: int) -> bool:
+        """Check a cached BLOB, recomputing its checksum only if the file has
+        changed since its last verification."""
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            return False
+
+        if stat.st_size != size:
+            return False
+        if stat.st_mtime_ns == verified:
+            return True
+
+        if _checksum(path) != checksum:
+            path.unlink()
+            return False
+
+        with self._connect() as db:
+            db.execute(
+                "UPDATE blobs SET verified = ? WHERE checksum = ?",
+                (stat.st_mtime_ns, checksum),
+            )
+        return True
+
+    def _fetch(self, name: str, tag: str) -> Path:
+        """Fetch a BLOB from the store and add it to the cache"""
+        tmp = self._path / "tmp" / f"{os.getpid()}.{threading.get_ident()}.part"
+        try:
+            with tmp.open("wb") as f:
+                writer = _HashingWriter(f)
+                size = stream(name, writer, tag)
+            checksum = writer.hash.hexdigest()
+            path = self._blob_path(checksum)
+            path.parent.mkdir(exist_ok=True)
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                tmp.unlink()
+            except FileNotFoundError:
+                pass
+            raise
+
+        with self._connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO blobs VALUES (?, ?, ?, ?, ?, ?)",
+                (name, tag, checksum, size, time.time(), path.stat().st_mtime_ns),
+            )
+            db.execute(
+                "UPDATE blobs SET verified = ? WHERE checksum = ?",
+                (path.stat().st_mtime_ns, checksum),
+            )
+        self.evict(keep=checksum)
+
+        return path
+
+    def pin(self, name: str, tag: str = "101") -> None:
+        """Pin a BLOB, such that it is never evicted"""
+        with self._connect() as db:
+            db.execute("INSERT OR IGNORE INTO pins VALUES (?, ?)", (name, tag))
+
+    def unpin(self, name: str, tag: str = "101") -> None:
+        """Unpin a BLOB, such that it can be evicted again"""
+        with self._connect() as db:
+            db.execute("DELETE FROM pins WHERE name = ? AND tag = ?", (name, tag))
+
+    def evict(self, budget: Optional[int] = None, keep: Optional[str] = None) -> int:
+        """Evict the least recently used BLOBs until the cache size fits
+        within *budget* bytes, if possible. Pinned BLOBs are not evicted. The
+        number of freed bytes is returned."""
+        if budget is None:
+            budget = self._budget
+
+        db = self._connect()
+        with db:
+            rows = db.execute(
+                "SELECT checksum, MAX(size), MAX(access) FROM blobs "
+                "GROUP BY checksum ORDER BY MAX(access)"
+            ).fetchall()
+            pinned = {
+                row[0]
+                for row in db.execute(
+                    "SELECT blobs.checksum FROM blobs JOIN pins "
+                    "ON blobs.name = pins.name AND blobs.tag = pins.tag"
+                )
+            }
+            total = sum(row[1] for row in rows)
+            freed = 0
+            for checksum, size, _ in rows:
+                if total <= budget:
+                    break
+                if (checksum == keep) or (checksum in pinned):
+                    continue
+                db.execute("DELETE FROM blobs WHERE checksum = ?", (checksum,))
+                try:
+                    self._blob_path(checksum).unlink()
+                except FileNotFoundError:
+                    pass
+                total -= size
+                freed += size
+
+        return freed
+
+    def entries(self) -> List[CacheEntry]:
+        """Get the entries of the cache index"""
+        rows = self._connect().execute(
+            "SELECT name, tag, checksum, size, access FROM blobs ORDER BY access"
+        )
+        return [CacheEntry(*row) for row in rows]
+
+    def clear(self) -> None:
+        """Remove all BLOBs from the cache, except pinned ones"""
+        self.evict(budget=0)
+
+    @property
+    def budget(self) -> int:
+        """The disk budget of the cache, in bytes"""
+        return self._budget
+
+    @budget.setter
+    def budget(self, value: int) -> None:
+        self._budget = value
+
+    @property
+    def path(self) -> Path:
+        """The location of the cache"""
+        return self._path
+
+    @property
+    def size(self) -> int:
+        """The total size of cached BLOBs, in bytes"""
+        row = self._connect().execute(
+            "SELECT SUM(size) FROM (SELECT MAX(size) AS size FROM blobs GROUP BY checksum)"
+        )
+        return row.fetchone()[0] or 0
+
+
+def _get_default() -> Cache:
+    """Get the default cache, under GRAND_DATA"""
+    global _default_cache
+
+    if _default_cache is None:
+        _default_cache = Cache()
+    return _default_cache
+
+
+def fetch(name: str, tag: str = "101", pin: bool = False) -> Path:
+    """Get the path to a verified local copy of a BLOB, using the default
+    cache under GRAND_DATA. If *pin* is true, the BLOB is never evicted."""
+    return _get_default().get(name, tag, pin)
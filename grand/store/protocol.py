@@ -1,8 +1,36 @@
+import base64
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import http.client
+import io
+import os
+from pathlib import Path
 import ssl
+import threading
+from typing import BinaryIO, Dict, Iterable, Iterator, Optional, Tuple, Union
+import urllib.parse
 import urllib.request
 import zlib
 
 
+BASE_URL = "https://github.com/grand-mother/store/releases/download"
+"""Base URL of the store"""
+
+_CHUNK_SIZE = 1 << 20
+"""Size of the data chunks read from the network"""
+
+_RETRIES = 3
+"""Number of attempts for resuming a failed transfer"""
+
+_MAX_REDIRECTS = 5
+"""Maximum number of HTTP redirections"""
+
+_WORKERS = 8
+"""Default number of concurrent transfers"""
+
+_TIMEOUT = 60
+"""Timeout of network operations, in seconds"""
+
+
 def _disable_certs() -> None:
     """Disable certificates check"""
     try:
@@ -22,12 +50,268 @@ class InvalidBLOB(IOError):
     pass
 
 
+class _StatusError(IOError):
+    """An unexpected HTTP status"""
+
+    def __init__(self, url: str, status: int, reason: str):
+        super().__init__(f"HTTP Error {status}: {reason} ({url})")
+        self.status = status
+
+
+def _proxy(scheme: str, netloc: str) -> Optional[urllib.parse.SplitResult]:
+    """Get the proxy for a host, if any, according to the system settings,
+    e.g. the HTTP_PROXY, HTTPS_PROXY and NO_PROXY environment variables."""
+    proxy = urllib.request.getproxies().get(scheme)
+    if (not proxy) or urllib.request.proxy_bypass(netloc):
+        return None
+    if "://" not in proxy:
+        proxy = f"http://{proxy}"
+    return urllib.parse.urlsplit(proxy)
+
+
+def _proxy_headers(proxy: Optional[urllib.parse.SplitResult]) -> Dict[str, str]:
+    """Get the authentication headers for a proxy"""
+    if (proxy is None) or (proxy.username is None):
+        return {}
+    username = urllib.parse.unquote(proxy.username)
+    password = urllib.parse.unquote(proxy.password or "")
+    credentials = base64.b64encode(f"{username}:{password}".encode()).decode()
+    return {"Proxy-Authorization": f"Basic {credentials}"}
+
+
+class _Connections(threading.local):
+    """Persistent HTTP connections of the current thread, by host and proxy"""
+
+    def __init__(self) -> None:
+        self.pool: Dict[Tuple[str, str, Optional[str]], http.client.HTTPConnection] = {}
+
+    def get(
+        self, scheme: str, netloc: str, proxy: Optional[urllib.parse.SplitResult] = None
+    ) -> http.client.HTTPConnection:
+        key = (scheme, netloc, None if proxy is None else proxy.geturl())
+        try:
+            return self.pool[key]
+        except KeyError:
+            pass
+
+        cls = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+        if proxy is None:
+            connection = cls(netloc, timeout=_TIMEOUT)
+        else:
+            # HTTPS requests are tunnelled through the proxy (CONNECT), while
+            # HTTP ones are forwarded by the proxy (absolute URIs).
+            connection = cls(proxy.hostname, proxy.port, timeout=_TIMEOUT)
+            if scheme == "https":
+                connection.set_tunnel(netloc, headers=_proxy_headers(proxy))
+        self.pool[key] = connection
+        return connection
+
+    def drop(self, scheme: str, netloc: str) -> None:
+        for key in [key for key in self.pool if key[:2] == (scheme, netloc)]:
+            self.pool.pop(key).close()
+
+
+_connections = _Connections()
+"""Connections pool, per thread"""
+
+
+def _url(name: str, tag: str) -> str:
+    """Get the URL of a BLOB in the store."""
+    return f"{BASE_URL}/{tag}/{name}.gz"
+
+
+def _request(url: str, headers: Optional[Dict[str, str]] = None) -> http.client.HTTPResponse:
+    """Send a GET request over a persistent connection, following redirects.
+
+    The returned response must be fully read, or the connection dropped,
+    before the next request from the same thread. Proxies are used according
+    to the system settings, as by urllib.
+    """
+    headers = {} if headers is None else headers
+    for _ in range(_MAX_REDIRECTS + 1):
+        parts = urllib.parse.urlsplit(url)
+        proxy = _proxy(parts.scheme, parts.netloc)
+        if (proxy is not None) and (parts.scheme == "http"):
+            target = urllib.parse.urlunsplit(parts._replace(fragment=""))
+            request_headers = {**headers, **_proxy_headers(proxy)}
+        else:
+            target = parts.path + (f"?{parts.query}" if parts.query else "")
+            request_headers = headers
+
+        for attempt in range(2):
+            connection = _connections.get(parts.scheme, parts.netloc, proxy)
+            try:
+                connection.request("GET", target, headers=request_headers)
+                response = connection.getresponse()
+            except (http.client.HTTPException, ConnectionError):
+                # The server might have closed an idle connection. Let us
+                # retry once with a fresh one.
+                _connections.drop(parts.scheme, parts.netloc)
+                if attempt > 0:
+                    raise
+            except Exception:
+                _connections.drop(parts.scheme, parts.netloc)
+                raise
+            else:
+                break
+
+        if response.status in (301, 302, 303, 307, 308):
+            location = response.getheader("Location")
+            response.read()
+            if location is None:
+                raise _StatusError(url, response.status, response.reason)
+            url = urllib.parse.urljoin(url, location)
+        elif response.status >= 400:
+            response.read()
+            raise _StatusError(url, response.status, response.reason)
+        else:
+            return response
+
+    raise _StatusError(url, response.status, "too many redirections")
+
+
 def get(name: str, tag: str = "101") -> bytes:
     """Get a BLOB from the store."""
-    base = "https://github.com/grand-mother/store/releases/download"
-    url = f"{base}/{tag}/{name}.gz"
+    sink = io.BytesIO()
+    stream(name, sink, tag)
+    return sink.getvalue()
+
+
+def _drop(url: str) -> None:
+    """Drop the connection used for an URL, e.g. after a failed transfer."""
+    parts = urllib.parse.urlsplit(url)
+    _connections.drop(parts.scheme, parts.netloc)
+
+
+def stream(
+    name: str,
+    sink: BinaryIO,
+    tag: str = "101",
+    retries: int = _RETRIES,
+    chunk_size: int = _CHUNK_SIZE,
+) -> int:
+    """Stream a BLOB from the store to a file-like *sink*.
+
+    The compressed data are read by chunks of *chunk_size* bytes and
+    decompressed incrementally, such that the memory usage does not depend on
+    the BLOB size. If the transfer fails, it is resumed from the last received
+    byte using an HTTP Range request, up to *retries* times. The number of
+    decompressed bytes written to *sink* is returned.
+    """
+    url = _url(name, tag)
+    decompressor = zlib.decompressobj(wbits=31)
+    offset, size, failures = 0, 0, 0
+
+    while True:
+        headers = {} if offset == 0 else {"Range": f"bytes={offset}-"}
+        try:
+            f = _request(url, headers)
+        except _StatusError as e:
+            # Do not retry if the BLOB does not exist
+            raise InvalidBLOB(e) from None
+        except Exception as e:
+            failures += 1
+            if failures > retries:
+                raise InvalidBLOB(e) from None
+            continue
+
+        try:
+            if (offset > 0) and (f.status != 206):
+                # The server does not support ranges. Skip the data already
+                # received.
+                skip = offset
+                while skip > 0:
+                    data = f.read(min(skip, chunk_size))
+                    if not data:
+                        raise IOError("truncated data")
+                    skip -= len(data)
+            length = f.getheader("Content-Length")
+            expected = None if length is None else offset + int(length)
+            if f.status == 200:
+                expected = None if length is None else int(length)
+
+            while True:
+                data = f.read(chunk_size)
+                if not data:
+                    break
+                offset += len(data)
+                data = decompressor.decompress(data)
+                sink.write(data)
+                size += len(data)
+
+            if (expected is not None) and (offset < expected):
+                raise IOError(f"truncated data ({offset} / {expected} bytes)")
+        except zlib.error as e:
+            _drop(url)
+            raise InvalidBLOB(e) from None
+        except Exception as e:
+            _drop(url)
+            failures += 1
+            if failures > retries:
+                raise InvalidBLOB(e) from None
+        else:
+            break
+
     try:
-        with urllib.request.urlopen(url) as f:
-            return zlib.decompress(f.read(), wbits=31)
+        data = decompressor.flush()
+        if not decompressor.eof:
+            raise zlib.error("truncated data")
     except Exception as e:
         raise InvalidBLOB(e) from None
+    sink.write(data)
+    size += len(data)
+
+    return size
+
+
+def get_many(
+    names: Iterable[str], tag: str = "101", workers: int = _WORKERS
+) -> Iterator[Tuple[str, bytes]]:
+    """Get several BLOBs from the store, concurrently.
+
+    BLOBs are fetched by a pool of *workers* threads, each one reusing its own
+    persistent connections to the store. (name, data) pairs are yielded as the
+    transfers complete, i.e. not necessarily in the order of *names*. An
+    InvalidBLOB error is raised when a failed transfer is reached.
+    """
+    names = list(names)
+    if not names:
+        return
+
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(names)))) as executor:
+        futures = {executor.submit(get, name, tag): name for name in names}
+        try:
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+        finally:
+            for future in futures:
+                future.cancel()
+
+
+def download(name: str, path: Union[Path, str], tag: str = "101") -> int:
+    """Download a BLOB from the store to a local file.
+
+    The BLOB is streamed to a temporary file, next to *path*. The latter is
+    atomically renamed to *path* once the transfer has succeeded. Thus, a
+    partial file is never left at *path*. The number of decompressed bytes is
+    returned. Local I/O errors are also reported as InvalidBLOB.
+    """
+    path = Path(path)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.part")
+    try:
+        try:
+            with tmp.open("wb") as f:
+                size = stream(name, f, tag)
+            os.replace(tmp, path)
+        except InvalidBLOB:
+            raise
+        except OSError as e:
+            raise InvalidBLOB(e) from e
+    except BaseException:
+        try:
+            tmp.unlink()
+        except FileNotFoundError:
+            pass
+        raise
+
+    return size
@@ -2,17 +2,23 @@
 """
 from __future__ import annotations
 
-from typing import Optional, Union
+from functools import lru_cache
+from pathlib import Path
+from typing import TYPE_CHECKING, Optional, Sequence, Tuple, Union
 from typing_extensions import Final
 
 from .coordinates import CartesianRepresentation, GeodeticRepresentation
 from .coordinates import ECEF, Geodetic, GRANDCS, LTP, _cartesian_to_horizontal
 from ..libs.gull import Snapshot as _Snapshot
+from . import harmonics
 
 import numpy
 import datetime
 from datetime import date
 
+if TYPE_CHECKING:
+    from .. import io
+
 _default_model: Final = "IGRF13"
 """The default geo-magnetic model, i.e. IGRF13.
    Reference: https://www.ngdc.noaa.gov/IAGA/vmod/igrf.html
@@ -26,6 +32,16 @@ _default_obstime: Final[datetime.date] = datetime.date(2020, 1, 1)
 """The default observation time if none is specified"""
 
 
+_BACKENDS: Final = {"gull": _Snapshot, "numpy": harmonics.Snapshot}
+"""The available implementations of geo-magnetic snapshots"""
+
+_SNAPSHOTS: Final = 32
+"""The number of memoized snapshots"""
+
+_LATTICE_SHAPE: Final = (11, 11, 11)
+"""The default number of (latitude, longitude, height) nodes of a lattice"""
+
+
 def __getattr__(name):
     if name == "model":
         return _default_model
@@ -47,6 +63,117 @@ def field(coordinates: Union[ECEF, Geodetic, GRANDCS, LTP]) -> CartesianRepresen
     return geomagnet.field
 
 
+@lru_cache(maxsize=_SNAPSHOTS)
+def _get_snapshot(backend: str, model: str, obstime: date):
+    """Get a memoized snapshot of a geo-magnetic model"""
+    try:
+        snapshot_type = _BACKENDS[backend]
+    except KeyError:
+        raise ValueError(f"invalid backend {backend}") from None
+    return snapshot_type(model, obstime)
+
+
+def field_arrays(
+    latitude: Union[float, numpy.ndarray],
+    longitude: Union[float, numpy.ndarray],
+    height: Union[float, numpy.ndarray],
+    obstime: Union[str, date, Sequence, numpy.ndarray, None] = None,
+    model: Optional[str] = None,
+    out: Optional[numpy.ndarray] = None,
+    declination: Optional[numpy.ndarray] = None,
+    inclination: Optional[numpy.ndarray] = None,
+    backend: str = "gull",
+    workers: Optional[int] = 1,
+) -> numpy.ndarray:
+    """Get the geo-magnetic field at geodetic locations, as raw arrays.
+
+    This is a lightweight alternative to :class:`Geomagnet`, e.g. for tight
+    loops or chunked pipelines. Snapshots of the model are memoized. The
+    (Bx, By, Bz) components, in local ENU and in Tesla, are returned as a (n,
+    3) array, written to *out* if provided. The declination and inclination
+    angles, in deg, are written to the corresponding buffers if provided. With
+    the GULL backend, large arrays are evaluated by *workers* threads (all
+    CPUs if `None`).
+    """
+    if model is None:
+        model = _default_model
+    if obstime is None:
+        obstime = _default_obstime
+
+    if isinstance(obstime, (str, datetime.date)):
+        if isinstance(obstime, str):
+            obstime = datetime.date.fromisoformat(obstime)
+        snapshot = _get_snapshot(backend, model, obstime)
+        n = numpy.size(latitude)
+        if out is None:
+            out = numpy.empty((n, 3))
+        if backend == "gull":
+            snapshot(latitude, longitude, height, workers=workers, out=out)
+        else:
+            snapshot(latitude, longitude, height, out=out)
+    else:
+        field = _field_at_dates(
+            backend, model, latitude, longitude, height, obstime, workers
+        )
+        if out is None:
+            out = field.reshape(-1, 3)
+        else:
+            out[...] = field.reshape(out.shape)
+
+    field = out.reshape(-1, 3)
+    bx, by, bz = field[:, 0], field[:, 1], field[:, 2]
+    if declination is not None:
+        numpy.arctan2(by, bx, out=declination)
+        numpy.rad2deg(declination, out=declination)
+        numpy.subtract(90.0, declination, out=declination)
+    if inclination is not None:
+        numpy.hypot(bx, by, out=inclination)
+        numpy.arctan2(inclination, bz, out=inclination)
+        numpy.rad2deg(inclination, out=inclination)
+        numpy.subtract(inclination, 90.0, out=inclination)
+
+    return out
+
+
+def _field_at_dates(
+    backend: str,
+    model: str,
+    latitude: numpy.ndarray,
+    longitude: numpy.ndarray,
+    height: numpy.ndarray,
+    obstime: Union[Sequence, numpy.ndarray],
+    workers: Optional[int] = 1,
+) -> numpy.ndarray:
+    """Evaluate the field at locations observed at various dates, computing
+    the model coefficients once per distinct date."""
+    if backend == "numpy":
+        return harmonics.field(latitude, longitude, height, obstime, model)
+
+    # Use one GULL snapshot per distinct date
+    dates = numpy.asarray(obstime, dtype="datetime64[D]")
+    latitude, longitude, height, dates = (
+        a.reshape(-1)
+        for a in numpy.broadcast_arrays(
+            numpy.asarray(latitude, dtype=float),
+            numpy.asarray(longitude, dtype=float),
+            numpy.asarray(height, dtype=float),
+            dates,
+        )
+    )
+    unique, index = numpy.unique(dates, return_inverse=True)
+    index = index.reshape(-1)
+
+    field = numpy.empty((latitude.size, 3))
+    for i, d in enumerate(unique.astype(object)):
+        sel = index == i
+        snapshot = _get_snapshot("gull", model, d)
+        field[sel] = snapshot(
+            latitude[sel], longitude[sel], height[sel], workers=workers
+        ).reshape(-1, 3)
+
+    return field[0] if latitude.size == 1 else field
+
+
 class Geomagnet:
     """Proxy to a geomagnetic model. 'IGRF13' is used as a default model.
     Get the geo-magnetic field components [Bx, By, Bz] on any geodetic location of
@@ -54,7 +181,10 @@ class Geomagnet:
     height (m) or provide location in ECEF, Geodetic, or GRAND coordinate system. TypeError
     will occur if location is not provided. For obstime, provide time in isoformat
     ('2020-01-19') or in datetime.date(2020, 1, 19). If obstime is not provided, a
-    default value ('2020-01-01') is used.
+    default value ('2020-01-01') is used. A sequence of obstimes, one per location,
+    can be provided as well. The field is computed with GULL, by default, or with
+    a vectorized NumPy implementation if *backend* is 'numpy'. With GULL, large
+    arrays of locations are evaluated by *workers* threads (all CPUs if None).
     """
 
     def __init__(
@@ -64,18 +194,26 @@ class Geomagnet:
         longitude: Union[float, numpy.ndarray] = None,
         height: Union[float, numpy.ndarray] = None,
         location: Union[ECEF, Geodetic, LTP, GRANDCS] = None,
-        obstime: Union[str, date] = None,
+        obstime: Union[str, date, Sequence, numpy.ndarray] = None,
+        backend: str = "gull",
+        workers: Optional[int] = 1,
     ) -> None:
 
         # print('location:', location, type(location))
         if model is None:
             model = _default_model
 
+        if backend not in _BACKENDS:
+            raise ValueError(f"invalid backend {backend}")
+
         # Make sure time is in isoformat of datetime.date() format.
         if obstime is None:
             obstime = _default_obstime
         elif isinstance(obstime, (str, datetime.date)):
             pass
+        elif isinstance(obstime, (list, tuple, numpy.ndarray)):
+            # One observation time per location
+            pass
         else:
             raise TypeError(
                 "obstime given is of type %s. Provide obstime in string or datetime.date type.\
@@ -85,7 +223,7 @@ class Geomagnet:
 
         # Make sure the location is in the correct format. i.e ECEF, Geodetic, GeodeticRepresentation,
         # or GRAND cs. OR latitude=deg, longitude=deg, height=meter.
-        if latitude != None and longitude != None and height != None:
+        if latitude is not None and longitude is not None and height is not None:
             geodetic_loc = Geodetic(latitude=latitude, longitude=longitude, height=height)
         elif isinstance(location, (ECEF, Geodetic, GeodeticRepresentation, LTP, GRANDCS)):
             geodetic_loc = Geodetic(location)
@@ -101,8 +239,27 @@ class Geomagnet:
         self.location = geodetic_loc
 
         # Calculate magnetic field
-        self.snapshot = _Snapshot(self.model, self.obstime)
-        Bfield = self.snapshot(geodetic_loc.latitude, geodetic_loc.longitude, geodetic_loc.height)
+        if isinstance(self.obstime, (str, datetime.date)):
+            d = self.obstime
+            if isinstance(d, str):
+                d = datetime.date.fromisoformat(d)
+            self.snapshot = _get_snapshot(backend, self.model, d)
+            args = (geodetic_loc.latitude, geodetic_loc.longitude, geodetic_loc.height)
+            if backend == "gull":
+                Bfield = self.snapshot(*args, workers=workers)
+            else:
+                Bfield = self.snapshot(*args)
+        else:
+            self.snapshot = None
+            Bfield = _field_at_dates(
+                backend,
+                self.model,
+                geodetic_loc.latitude,
+                geodetic_loc.longitude,
+                geodetic_loc.height,
+                self.obstime,
+                workers,
+            )
 
         # Output magnetic field is either in [Bx, By, Bz] or [[Bx1, By1, Bz1], [Bx2, By2, Bz2], ....]
         if Bfield.size == 3:
@@ -116,3 +273,187 @@ class Geomagnet:
         azimuth, elevation, norm = _cartesian_to_horizontal(Bx, By, Bz)
         self.declination = azimuth
         self.inclination = -elevation
+
+    @staticmethod
+    def lattice(
+        latitude: Tuple[float, float],
+        longitude: Tuple[float, float],
+        height: Tuple[float, float],
+        shape: Sequence[int] = _LATTICE_SHAPE,
+        model: Optional[str] = None,
+        obstime: Union[str, date, None] = None,
+    ) -> Lattice:
+        """Tabulate the geo-magnetic field over a region, for fast queries.
+        See :class:`Lattice` for the meaning of arguments."""
+        return Lattice.build(latitude, longitude, height, shape, model, obstime)
+
+
+class Lattice:
+    """Geo-magnetic field tabulated over a regular (latitude, longitude,
+    height) grid, for a given model and observation time.
+
+    Queries are answered by trilinear interpolation of the tabulated field. The
+    maximum deviation w.r.t. the exact model, evaluated at the centers of the
+    lattice cells, is stored as *error*, in Tesla.
+    """
+
+    def __init__(
+        self,
+        latitude: numpy.ndarray,
+        longitude: numpy.ndarray,
+        height: numpy.ndarray,
+        field: numpy.ndarray,
+        model: str = _default_model,
+        obstime: Union[str, date] = _default_obstime,
+        error: Optional[float] = None,
+    ) -> None:
+        nodes = [numpy.asarray(a, dtype=float) for a in (latitude, longitude, height)]
+        for a in nodes:
+            if (a.ndim != 1) or (a.size < 2):
+                raise ValueError("lattice nodes must be 1D arrays with at least 2 values")
+        field = numpy.asarray(field, dtype=float)
+        if field.shape != (*(a.size for a in nodes), 3):
+            raise ValueError(f"inconsistent field shape {field.shape}")
+
+        self.latitude, self.longitude, self.height = nodes
+        self.field = field
+        self.model = model
+        self.obstime = obstime
+        self.error = error
+
+    @classmethod
+    def build(
+        cls,
+        latitude: Tuple[float, float],
+        longitude: Tuple[float, float],
+        height: Tuple[float, float],
+        shape: Sequence[int] = _LATTICE_SHAPE,
+        model: Optional[str] = None,
+        obstime: Union[str, date, None] = None,
+    ) -> Lattice:
+        """Tabulate the geo-magnetic field over a region, given as (min, max)
+        ranges of latitude (deg), longitude (deg) and height (m). The *shape*
+        gives the number of nodes along each axis."""
+        if model is None:
+            model = _default_model
+        if obstime is None:
+            obstime = _default_obstime
+
+        nodes = [
+            numpy.linspace(a[0], a[1], n)
+            for a, n in zip((latitude, longitude, height), shape)
+        ]
+        snapshot = _Snapshot(model, obstime)
+
+        def evaluate(lat, lon, h):
+            grid = numpy.meshgrid(lat, lon, h, indexing="ij")
+            field = snapshot(*(a.ravel() for a in grid))
+            return field.reshape(*grid[0].shape, 3)
+
+        lattice = cls(*nodes, evaluate(*nodes), model, obstime)
+
+        # Estimate the interpolation error at the cells centers
+        centers = [0.5 * (a[1:] + a[:-1]) for a in nodes]
+        exact = evaluate(*centers).reshape(-1, 3)
+        grid = numpy.meshgrid(*centers, indexing="ij")
+        approx = lattice._interpolate(*(a.ravel() for a in grid))
+        lattice.error = float(numpy.max(numpy.linalg.norm(approx - exact, axis=1)))
+
+        return lattice
+
+    def __call__(
+        self,
+        latitude: Union[float, numpy.ndarray, None] = None,
+        longitude: Union[float, numpy.ndarray, None] = None,
+        height: Union[float, numpy.ndarray, None] = None,
+        location: Union[ECEF, Geodetic, LTP, GRANDCS, None] = None,
+    ) -> CartesianRepresentation:
+        """Get the interpolated geo-magnetic field, in local ENU components,
+        at the given location(s)."""
+        if location is not None:
+            location = Geodetic(location)
+            latitude, longitude, height = (
+                location.latitude,
+                location.longitude,
+                location.height,
+            )
+        elif latitude is None or longitude is None or height is None:
+            raise TypeError("Provide either a location or latitude, longitude and height.")
+
+        size = numpy.size(latitude)
+        latitude, longitude, height = numpy.broadcast_arrays(
+            *(numpy.asarray(a, dtype=float).ravel() for a in (latitude, longitude, height))
+        )
+        field = self._interpolate(latitude, longitude, height)
+        if size == 1:
+            field = field[0]
+            return CartesianRepresentation(x=field[0], y=field[1], z=field[2])
+        else:
+            return CartesianRepresentation(x=field[:, 0], y=field[:, 1], z=field[:, 2])
+
+    def _interpolate(
+        self, latitude: numpy.ndarray, longitude: numpy.ndarray, height: numpy.ndarray
+    ) -> numpy.ndarray:
+        """Trilinear interpolation of the tabulated field, as a (n, 3) array"""
+        indices, weights = [], []
+        axes = (self.latitude, self.longitude, self.height)
+        for nodes, x in zip(axes, (latitude, longitude, height)):
+            step = (nodes[-1] - nodes[0]) / (nodes.size - 1)
+            u = (x - nodes[0]) / step
+            if numpy.any(u < -1e-9) or numpy.any(u > nodes.size - 1 + 1e-9):
+                raise ValueError("location(s) outside of the lattice")
+            i = numpy.clip(numpy.floor(u).astype(int), 0, nodes.size - 2)
+            indices.append(i)
+            weights.append(numpy.clip(u - i, 0, 1))
+
+        (i, j, k), (wi, wj, wk) = indices, weights
+        field = numpy.zeros((latitude.size, 3))
+        for di, ai in ((0, 1 - wi), (1, wi)):
+            for dj, aj in ((0, 1 - wj), (1, wj)):
+                for dk, ak in ((0, 1 - wk), (1, wk)):
+                    field += (ai * aj * ak)[:, None] * self.field[i + di, j + dj, k + dk]
+        return field
+
+    @classmethod
+    def load(cls, source: Union[Path, str, io.DataNode]) -> Lattice:
+        """Load a lattice from a file or from a data node"""
+        from .. import io
+
+        if isinstance(source, io.DataNode):
+            node = source
+            latitude, longitude, height, field = node.read(
+                "latitude", "longitude", "height", "field", dtype="f8"
+            )
+            model, obstime, error = node.read("model", "obstime", "error")
+            return cls(
+                latitude,
+                longitude,
+                height,
+                field,
+                model,
+                datetime.date.fromisoformat(obstime),
+                None if numpy.isnan(error) else float(error),
+            )
+        else:
+            with io.open(source) as root:
+                return cls.load(root)
+
+    def dump(self, destination: Union[Path, str, io.DataNode]) -> None:
+        """Dump the lattice to a file or to a data node"""
+        from .. import io
+
+        if isinstance(destination, io.DataNode):
+            node = destination
+            node.write("latitude", self.latitude, dtype="f8")
+            node.write("longitude", self.longitude, dtype="f8")
+            node.write("height", self.height, dtype="f8")
+            node.write("field", self.field, dtype="f8")
+            node.write("model", self.model)
+            obstime = self.obstime
+            if isinstance(obstime, datetime.date):
+                obstime = obstime.isoformat()
+            node.write("obstime", obstime)
+            node.write("error", numpy.nan if self.error is None else self.error, dtype="f8")
+        else:
+            with io.open(destination, "w") as root:
+                self.dump(root)
@@ -0,0 +1,471 @@
+"""Vectorized spherical harmonics evaluation of geo-magnetic models
+"""
+from __future__ import annotations
+
+import datetime
+from functools import lru_cache
+import os
+from pathlib import Path
+from typing import List, NamedTuple, Optional, Sequence, Tuple, Union
+from typing_extensions import Final
+
+import numpy
+
+from ..libs import DATADIR
+
+__all__ = ["Snapshot", "field"]
+
+
+_CHUNK_SIZE: Final = 10000
+"""Number of points evaluated at once"""
+
+_EARTH_RADIUS: Final = 6371.2
+"""The reference radius of the models, in km"""
+
+_A2: Final = 40680631.59
+"""The squared equatorial radius of the WGS84 ellipsoid, in km^2"""
+
+_B2: Final = 40408299.98
+"""The squared polar radius of the WGS84 ellipsoid, in km^2"""
+
+_CACHEDIR: Optional[Path] = None
+"""Location of the cache of parsed models, defaults to GRAND_DATA/geomagnet"""
+
+_FIRST_DAY: Final = (1, 32, 60, 91, 121, 152, 182, 213, 244, 274, 305, 335)
+"""The index of the first day of each month, for a non leap year"""
+
+
+class _Model(NamedTuple):
+    """A single epoch of a geo-magnetic model, as stored in a COF file"""
+
+    name: str
+    epoch: float
+    years: Tuple[float, float]
+    altitude: Tuple[float, float]
+    order: int
+    gh: numpy.ndarray
+    sv_order: int
+    dgh: numpy.ndarray
+
+
+@lru_cache(maxsize=None)
+def _load(path: str) -> Tuple[_Model, ...]:
+    """Load the models of a COF file.
+
+    Parsed models are cached as a binary table, which is memory mapped on
+    subsequent loads. The cache is keyed by the size and the modification
+    time of the COF file.
+    """
+    cachedir = _CACHEDIR
+    if cachedir is None:
+        # Lazy import in order to avoid a circular reference
+        from .. import GRAND_DATA
+
+        cachedir = Path(GRAND_DATA) / "geomagnet"
+
+    stat = os.stat(path)
+    cache = cachedir / f"{Path(path).stem}.{stat.st_size}.{stat.st_mtime_ns}.npy"
+    try:
+        table = numpy.load(cache, mmap_mode="r")
+    except (OSError, ValueError):
+        pass
+    else:
+        return tuple(
+            _Model(
+                str(row["name"]),
+                float(row["epoch"]),
+                (float(row["years"][0]), float(row["years"][1])),
+                (float(row["altitude"][0]), float(row["altitude"][1])),
+                int(row["order"]),
+                row["gh"][: row["order"] * (row["order"] + 2)],
+                int(row["sv_order"]),
+                row["dgh"][: row["sv_order"] * (row["sv_order"] + 2)],
+            )
+            for row in table
+        )
+
+    models = _parse(path)
+
+    order = max(max(model.order, model.sv_order) for model in models)
+    size = order * (order + 2)
+    dtype = numpy.dtype(
+        [
+            ("name", "U16"),
+            ("epoch", "f8"),
+            ("years", "f8", (2,)),
+            ("altitude", "f8", (2,)),
+            ("order", "i4"),
+            ("sv_order", "i4"),
+            ("gh", "f8", (size,)),
+            ("dgh", "f8", (size,)),
+        ]
+    )
+    table = numpy.zeros(len(models), dtype=dtype)
+    for i, model in enumerate(models):
+        table[i]["name"] = model.name
+        table[i]["epoch"] = model.epoch
+        table[i]["years"] = model.years
+        table[i]["altitude"] = model.altitude
+        table[i]["order"] = model.order
+        table[i]["sv_order"] = model.sv_order
+        table[i]["gh"][: model.gh.size] = model.gh
+        table[i]["dgh"][: model.dgh.size] = model.dgh
+
+    try:
+        cachedir.mkdir(parents=True, exist_ok=True)
+        tmp = cache.with_name(f".{cache.name}.{os.getpid()}.part")
+        with tmp.open("wb") as f:
+            numpy.save(f, table)
+        os.replace(tmp, cache)
+    except OSError:
+        # The cache is optional, e.g. for a read-only file system
+        pass
+
+    return models
+
+
+def _parse(path: str) -> Tuple[_Model, ...]:
+    """Parse the models from a COF file, in geomag70 format"""
+    models: List[_Model] = []
+
+    def coefficient(n, m, h):
+        return n * n - 1 + (2 * m - 1 + h if m > 0 else 0)
+
+    with open(path) as f:
+        for line in f:
+            tokens = line.split()
+            if not tokens:
+                continue
+            try:
+                n, m = int(tokens[0]), int(tokens[1])
+            except ValueError:
+                # This is a model header
+                epoch = float(tokens[1])
+                order, sv_order = int(tokens[2]), int(tokens[3])
+                years = (float(tokens[5]), float(tokens[6]))
+                altitude = (float(tokens[7]), float(tokens[8]))
+                models.append(
+                    _Model(
+                        tokens[0],
+                        epoch,
+                        years,
+                        altitude,
+                        order,
+                        numpy.zeros(order * (order + 2)),
+                        sv_order,
+                        numpy.zeros(sv_order * (sv_order + 2)),
+                    )
+                )
+                continue
+
+            if not models:
+                raise ValueError(f"invalid syntax in {path}")
+            model = models[-1]
+            g, h, dg, dh = map(float, tokens[2:6])
+            if n <= model.order:
+                model.gh[coefficient(n, m, 0)] = g
+                if m > 0:
+                    model.gh[coefficient(n, m, 1)] = h
+            if n <= model.sv_order:
+                model.dgh[coefficient(n, m, 0)] = dg
+                if m > 0:
+                    model.dgh[coefficient(n, m, 1)] = dh
+
+    if not models:
+        raise ValueError(f"no model in {path}")
+
+    return tuple(models)
+
+
+def _decimal_year(date: datetime.date) -> float:
+    """Convert a date to a decimal year, following geomag70 conventions"""
+    leap = (date.year % 4 == 0) and ((date.year % 100 != 0) or (date.year % 400 == 0))
+    day = _FIRST_DAY[date.month - 1] + date.day - 1
+    if leap and (date.month > 2):
+        day += 1
+    return date.year + day / (366.0 if leap else 365.0)
+
+
+def _pad(a: numpy.ndarray, size: int) -> numpy.ndarray:
+    """Pad coefficients with zeros, up to *size*"""
+    if a.size >= size:
+        return a
+    return numpy.concatenate((a, numpy.zeros(size - a.size)))
+
+
+def _coefficients(
+    models: Tuple[_Model, ...], year: float
+) -> Tuple[int, numpy.ndarray, Tuple[float, float]]:
+    """Get the model order, the Gauss coefficients and the altitude range (in
+    km) at a decimal year"""
+    if (year < models[0].years[0]) or (year > models[-1].years[1]):
+        raise ValueError(f"date out of model range ({year:.2f})")
+
+    for i, model in enumerate(models):
+        if year < model.years[1]:
+            break
+
+    if (model.sv_order == 0) and (i + 1 < len(models)):
+        # Interpolate between consecutive epochs
+        other = models[i + 1]
+        order = max(model.order, other.order)
+        size = order * (order + 2)
+        factor = (year - model.epoch) / (other.epoch - model.epoch)
+        gh1, gh2 = _pad(model.gh, size), _pad(other.gh, size)
+        return order, gh1 + factor * (gh2 - gh1), model.altitude
+    else:
+        # Extrapolate using the secular variation
+        order = max(model.order, model.sv_order)
+        size = order * (order + 2)
+        factor = year - model.epoch
+        return order, _pad(model.gh, size) + factor * _pad(model.dgh, size), model.altitude
+
+
+def _field(
+    order: int,
+    gh: numpy.ndarray,
+    latitude: numpy.ndarray,
+    longitude: numpy.ndarray,
+    altitude: numpy.ndarray,
+) -> numpy.ndarray:
+    """Evaluate the field at geodetic points, as (east, north, up) components
+    in nT. The algorithm is the one of geomag70, vectorized over points."""
+    dtr = numpy.pi / 180
+    elevation = 1e-03 * altitude
+    slat = numpy.sin(latitude * dtr)
+    clat = numpy.cos(numpy.clip(latitude, -89.999, 89.999) * dtr)
+    sl = [numpy.zeros_like(longitude), numpy.sin(longitude * dtr)]
+    cl = [numpy.ones_like(longitude), numpy.cos(longitude * dtr)]
+
+    # Geodetic to geocentric conversion
+    aa = _A2 * clat * clat
+    bb = _B2 * slat * slat
+    cc = aa + bb
+    dd = numpy.sqrt(cc)
+    r = numpy.sqrt(elevation * (elevation + 2.0 * dd) + (_A2 * aa + _B2 * bb) / cc)
+    cd = (elevation + dd) / r
+    sd = (_A2 - _B2) / dd * slat * clat / r
+    slat, clat = slat * cd - clat * sd, clat * cd + slat * sd
+    ratio = _EARTH_RADIUS / r
+
+    # Associated Legendre functions, and their derivatives, are computed by
+    # recurrence. The indexing follows geomag70, i.e. it starts at 1.
+    npq = (order * (order + 3)) // 2
+    p: List[numpy.ndarray] = [None] * (npq + 1)  # type: ignore
+    q: List[numpy.ndarray] = [None] * (npq + 1)  # type: ignore
+    s3 = numpy.sqrt(3.0)
+    p[1] = 2.0 * slat
+    p[2] = 2.0 * clat
+    p[3] = 4.5 * slat * slat - 1.5
+    p[4] = 3.0 * s3 * clat * slat
+    q[1] = -clat
+    q[2] = slat
+    q[3] = -3.0 * clat * slat
+    q[4] = s3 * (slat * slat - clat * clat)
+
+    x = numpy.zeros_like(latitude)
+    y = numpy.zeros_like(latitude)
+    z = numpy.zeros_like(latitude)
+    l, n, m = 0, 0, 1
+    for k in range(1, npq + 1):
+        if n < m:
+            m = 0
+            n += 1
+            rr = ratio ** (n + 2)
+            fn = float(n)
+        fm = float(m)
+        if k >= 5:
+            if m == n:
+                aa = numpy.sqrt(1.0 - 0.5 / fm)
+                j = k - n - 1
+                p[k] = (1.0 + 1.0 / fm) * aa * clat * p[j]
+                q[k] = aa * (clat * q[j] + slat / fm * p[j])
+                sl.append(sl[m - 1] * cl[1] + cl[m - 1] * sl[1])
+                cl.append(cl[m - 1] * cl[1] - sl[m - 1] * sl[1])
+            else:
+                aa = numpy.sqrt(fn * fn - fm * fm)
+                bb = numpy.sqrt((fn - 1.0) * (fn - 1.0) - fm * fm) / aa
+                cc = (2.0 * fn - 1.0) / aa
+                ii = k - n
+                j = k - 2 * n + 1
+                p[k] = (fn + 1.0) * (cc * slat / fn * p[ii] - bb / (fn - 1.0) * p[j])
+                q[k] = cc * (slat * q[ii] - clat / fn * p[ii]) - bb * q[j]
+
+        aa = rr * gh[l]
+        if m == 0:
+            x += aa * q[k]
+            z -= aa * p[k]
+            l += 1
+        else:
+            bb = rr * gh[l + 1]
+            cc = aa * cl[m] + bb * sl[m]
+            x += cc * q[k]
+            z -= cc * p[k]
+            dd = aa * sl[m] - bb * cl[m]
+            positive = clat > 0
+            y += numpy.where(
+                positive,
+                dd * fm * p[k] / ((fn + 1.0) * numpy.where(positive, clat, 1.0)),
+                dd * q[k] * slat,
+            )
+            l += 2
+        m += 1
+
+    # Rotate back to geodetic components
+    x, z = x * cd + z * sd, z * cd - x * sd
+
+    return numpy.stack((y, x, -z), axis=-1)
+
+
+def _evaluate(
+    order: int,
+    gh: numpy.ndarray,
+    index: Optional[numpy.ndarray],
+    latitude: numpy.ndarray,
+    longitude: numpy.ndarray,
+    altitude: numpy.ndarray,
+    out: Optional[numpy.ndarray] = None,
+) -> numpy.ndarray:
+    """Evaluate the field by chunks, in Tesla. If an *index* is provided, *gh*
+    is a table of coefficients with one column per date, and *index* gives the
+    column to use for each point."""
+    if out is None:
+        field = numpy.empty((latitude.size, 3))
+    else:
+        field = out.reshape(latitude.size, 3)
+        if not numpy.shares_memory(field, out):
+            raise ValueError("out must be a contiguous array of 3 values per location")
+    for i0 in range(0, latitude.size, _CHUNK_SIZE):
+        i1 = i0 + _CHUNK_SIZE
+        coefficients = gh if index is None else gh[:, index[i0:i1]]
+        field[i0:i1] = _field(
+            order, coefficients, latitude[i0:i1], longitude[i0:i1], altitude[i0:i1]
+        )
+    field *= 1e-09
+    return out if out is not None else field
+
+
+def field(
+    latitude: Union[float, numpy.ndarray],
+    longitude: Union[float, numpy.ndarray],
+    altitude: Union[float, numpy.ndarray],
+    obstime: Union[str, datetime.date, Sequence, numpy.ndarray],
+    model: str = "IGRF13",
+    out: Optional[numpy.ndarray] = None,
+) -> numpy.ndarray:
+    """Get the magnetic field at Earth locations observed at various dates.
+
+    The Gauss coefficients are computed once per distinct date, and all
+    (date, location) pairs are evaluated in a single pass. Dates can be
+    given as ISO strings, :class:`datetime.date` or numpy.datetime64 objects.
+    Arguments are broadcast together. The field is returned in local (east,
+    north, up) components, in Tesla. It is written to *out*, with 3 values per
+    location, if provided.
+    """
+    dates = numpy.asarray(obstime, dtype="datetime64[D]")
+    latitude, longitude, altitude, dates = (
+        a.reshape(-1)
+        for a in numpy.broadcast_arrays(
+            numpy.asarray(latitude, dtype=float),
+            numpy.asarray(longitude, dtype=float),
+            numpy.asarray(altitude, dtype=float),
+            dates,
+        )
+    )
+
+    unique, index = numpy.unique(dates, return_inverse=True)
+    index = index.reshape(-1)
+    models = _load(f"{DATADIR}/gull/{model}.COF")
+    coefficients = [_coefficients(models, _decimal_year(d)) for d in unique.astype(object)]
+
+    order = max(c[0] for c in coefficients)
+    size = order * (order + 2)
+    gh = numpy.stack([_pad(c[1], size) for c in coefficients], axis=1)
+
+    altitude_min = 1e03 * numpy.array([c[2][0] for c in coefficients])
+    altitude_max = 1e03 * numpy.array([c[2][1] for c in coefficients])
+    if numpy.any(altitude < altitude_min[index]) or numpy.any(altitude > altitude_max[index]):
+        raise ValueError("altitude out of model range")
+
+    field = _evaluate(order, gh, index, latitude, longitude, altitude, out)
+
+    if out is not None:
+        return out
+    return field[0] if latitude.size == 1 else field
+
+
+class Snapshot:
+    """Vectorized NumPy evaluation of a geo-magnetic model at a given date
+
+    This is a drop-in alternative to :class:`grand.libs.gull.Snapshot`, using
+    the same model data. The spherical harmonics expansion is evaluated for
+    many points at once, instead of point by point.
+    """
+
+    def __init__(self, model: str = "IGRF13", date: Union[str, datetime.date] = "2020-01-01"):
+        """Create a snapshot of the geo-magnetic field
+
+        Parameters
+        ----------
+        model : str
+            The geo-magnetic model to use (IGRF13, or WMM2020)
+        date : str or datetime.date
+            The day at which the snapshot is taken
+
+        Raises
+        ------
+        ValueError
+            The model data could not be parsed or the date is out of range
+        """
+        if isinstance(date, str):
+            date = datetime.date.fromisoformat(date)
+
+        models = _load(f"{DATADIR}/gull/{model}.COF")
+        self._order, self._gh, altitude = _coefficients(models, _decimal_year(date))
+        self._altitude = (1e03 * altitude[0], 1e03 * altitude[1])
+        self._model, self._date = model, date
+
+    def __call__(self, latitude, longitude, altitude=None, out=None):
+        """Get the magnetic field at a given Earth location. The result is
+        written to *out*, with 3 values per location, if provided."""
+        latitude = numpy.asarray(latitude, dtype=float)
+        longitude = numpy.asarray(longitude, dtype=float)
+        if latitude.size != longitude.size:
+            raise ValueError("latitude and longitude must have the same size")
+
+        if altitude is None:
+            altitude = numpy.zeros_like(latitude)
+        else:
+            altitude = numpy.asarray(altitude, dtype=float)
+            if latitude.size != altitude.size:
+                raise ValueError("latitude and altitude must have the same size")
+
+        if numpy.any(altitude < self._altitude[0]) or numpy.any(altitude > self._altitude[1]):
+            raise ValueError("altitude out of model range")
+
+        latitude, longitude, altitude = (a.reshape(-1) for a in (latitude, longitude, altitude))
+        field = _evaluate(self._order, self._gh, None, latitude, longitude, altitude, out)
+
+        if out is not None:
+            return out
+        return field[0] if latitude.size == 1 else field
+
+    @property
+    def altitude(self):
+        """The altitude range of the snapshot"""
+        return self._altitude
+
+    @property
+    def date(self):
+        """The date of the snapshot"""
+        return self._date
+
+    @property
+    def model(self):
+        """The world magnetic model"""
+        return self._model
+
+    @property
+    def order(self):
+        """The approximation order of the model"""
+        return self._order
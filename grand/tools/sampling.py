@@ -0,0 +1,125 @@
+"""Regular sampling of traces
+"""
+from __future__ import annotations
+
+import math
+from typing import Any, Tuple, Union
+
+import numpy
+from numpy.lib.mixins import NDArrayOperatorsMixin
+
+__all__ = ["TimeAxis", "time_slice"]
+
+
+class TimeAxis(NDArrayOperatorsMixin):
+    """Regular time axis, t = t0 + dt * i for i in [0, n).
+
+    Only *t0*, *dt* and *n* are stored, and the time values are materialised
+    on demand, e.g. by numpy.asarray. Slices with a positive step are also
+    time axes, and arithmetic operations return numpy arrays.
+    """
+
+    __slots__ = ("t0", "dt", "n")
+
+    def __init__(self, t0: float, dt: float, n: int) -> None:
+        if n < 0:
+            raise ValueError(f"invalid number of samples ({n})")
+        self.t0 = float(t0)
+        self.dt = float(dt)
+        self.n = int(n)
+
+    @classmethod
+    def compress(
+        cls, t: Union[numpy.ndarray, TimeAxis], rtol: float = 1e-03
+    ) -> Union[numpy.ndarray, TimeAxis]:
+        """Get a time axis for regularly sampled times *t*, or *t* itself
+        otherwise. Samples may deviate from the regular axis by at most
+        *rtol* times the sampling step."""
+        if isinstance(t, TimeAxis):
+            return t
+
+        t = numpy.asarray(t)
+        if (t.ndim != 1) or (t.size < 2):
+            return t
+
+        dt = (float(t[-1]) - float(t[0])) / (t.size - 1)
+        if dt <= 0:
+            return t
+
+        axis = cls(t[0], dt, t.size)
+        if numpy.max(numpy.abs(t - numpy.asarray(axis))) > rtol * dt:
+            return t
+        else:
+            return axis
+
+    def __repr__(self) -> str:
+        return f"TimeAxis(t0={self.t0!r}, dt={self.dt!r}, n={self.n!r})"
+
+    def __len__(self) -> int:
+        return self.n
+
+    @property
+    def size(self) -> int:
+        return self.n
+
+    @property
+    def shape(self) -> tuple:
+        return (self.n,)
+
+    @property
+    def ndim(self) -> int:
+        return 1
+
+    @property
+    def dtype(self) -> numpy.dtype:
+        return numpy.dtype("f8")
+
+    def __array__(self, dtype: Any = None, copy: Any = None) -> numpy.ndarray:
+        t = self.t0 + self.dt * numpy.arange(self.n)
+        return t if dtype is None else t.astype(dtype)
+
+    def __array_ufunc__(self, ufunc, method, *inputs, **kwargs):
+        inputs = tuple(numpy.asarray(v) if isinstance(v, TimeAxis) else v for v in inputs)
+        return getattr(ufunc, method)(*inputs, **kwargs)
+
+    def __iter__(self):
+        return iter(numpy.asarray(self))
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(self.n)
+            if step > 0:
+                n = max(0, -(-(stop - start) // step))
+                return TimeAxis(self.t0 + start * self.dt, step * self.dt, n)
+        elif isinstance(key, (int, numpy.integer)):
+            i = int(key)
+            if i < 0:
+                i += self.n
+            if not 0 <= i < self.n:
+                raise IndexError(f"index {key} is out of bounds for size {self.n}")
+            return self.t0 + i * self.dt
+
+        return numpy.asarray(self)[key]
+
+    def astype(self, dtype: Any, copy: bool = True) -> numpy.ndarray:
+        return numpy.asarray(self, dtype=dtype)
+
+    def flatten(self) -> numpy.ndarray:
+        return numpy.asarray(self)
+
+
+def time_slice(t: Union[numpy.ndarray, TimeAxis], window: Tuple[float, float]) -> slice:
+    """Get the slice of samples of increasing times *t* within a time
+    *window*, (t_min, t_max), bounds included"""
+    t_min, t_max = window
+    if isinstance(t, TimeAxis):
+        # Bounds are matched up to rounding errors
+        n = t.n
+        i0 = min(n, max(0, math.ceil((t_min - t.t0) / t.dt - 1e-09)))
+        i1 = min(n, max(0, math.floor((t_max - t.t0) / t.dt + 1e-09) + 1))
+    else:
+        t = numpy.asarray(t)
+        i0 = int(numpy.searchsorted(t, t_min, side="left"))
+        i1 = int(numpy.searchsorted(t, t_max, side="right"))
+    return slice(i0, max(i0, i1))
+
@@ -3,10 +3,13 @@
 
 from __future__ import annotations
 
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import enum
 import os
 from pathlib import Path
-from typing import Optional, Union, Any
+import shutil
+import threading
+from typing import Any, Callable, List, Optional, Union
 from typing_extensions import Final
 
 import numpy as np
@@ -22,11 +25,13 @@ from .coordinates import (
 )
 from ..libs.turtle import Map as _Map, Stack as _Stack, Stepper as _Stepper
 from .. import store
+from ..store.cache import _checksum, _get_default as _get_store_cache
 from .._core import ffi, lib
 
 __all__ = [
     "elevation",
     "distance",
+    "height_above_ground",
     "geoid_undulation",
     "update_data",
     "cachedir",
@@ -52,6 +57,14 @@ _DEFAULT_MODEL: Final = "SRTMGL1"
 """The default topographic model"""
 
 
+_CHUNK_SIZE: Final = 100000
+"""Default number of points processed at once by bulk queries"""
+
+
+_DOWNLOAD_WORKERS: Final = 8
+"""Default number of concurrent downloads of topography tiles"""
+
+
 _default_topography: Optional["Topography"] = None
 """Stack for the topographic data"""
 
@@ -86,6 +99,18 @@ def elevation(coordinates, reference: Optional[str] = _default_reference):
     return _default_topography.elevation(coordinates, reference)
 
 
+def height_above_ground(
+    coordinates, chunk_size: int = _CHUNK_SIZE, dtype: Union[str, np.dtype, None] = None
+) -> np.ndarray:
+    """Get the height of the given coordinates above the topography ground."""
+    global _default_topography
+
+    if _default_topography is None:
+        _CACHEDIR.mkdir(exist_ok=True)
+        _default_topography = Topography(_CACHEDIR)
+    return _default_topography.height_above_ground(coordinates, chunk_size, dtype)
+
+
 def _get_geoid():
     global _geoid
 
@@ -131,14 +156,29 @@ def geoid_undulation(coordinates=None, latitude=None, longitude=None):
     return geoid.elevation(longitude, latitude)
 
 
-def update_data(coordinates=None, clear: bool = False, radius: float = None):
+def update_data(
+    coordinates=None,
+    clear: bool = False,
+    radius: float = None,
+    workers: int = _DOWNLOAD_WORKERS,
+    progress: Optional[Callable[[int, int, str], None]] = None,
+):
 
     """Update the cache of topography data.
     Data are stored in https://github.com/grand-mother/store/releases.
     Locally saved as .../grand/grand/tools/data/topography/*.SRTMGL1.hgt
+
+    The list of tiles covering the requested area is computed first. Missing
+    tiles are then downloaded concurrently, using at most *workers* threads.
+    Tiles are fetched through the content-addressed store cache, which
+    stream-decompresses them and verifies their checksum, and they are linked
+    from the topography cache. If provided, *progress* is called once each
+    tile is ready as progress(done, total, basename).
     """
     if clear:
         for p in _CACHEDIR.glob("**/*.*"):
+            if p.is_symlink():
+                _get_store_cache().unpin(p.name)
             p.unlink()
 
     if coordinates is not None:
@@ -193,36 +233,97 @@ def update_data(coordinates=None, clear: bool = False, radius: float = None):
         longitude = [int(np.floor(lon)) for lon in longitude]
         latitude = [int(np.floor(lat)) for lat in latitude]
 
-        for lat in range(latitude[0], latitude[1] + 1):
-            for lon in range(longitude[0], longitude[1] + 1):
-                ns = "S" if lat < 0 else "N"
-                ew = "W" if lon < 0 else "E"
-                lat = -lat if lat < 0 else lat
-                lon = -lon if lon < 0 else lon
-
-                basename = f"{ns}{lat:02.0f}{ew}{lon:03.0f}.SRTMGL1.hgt"
-                path = _CACHEDIR / basename
-                if not path.exists():
-                    print("Caching data for", path)
-                    try:
-                        data = store.get(
-                            basename
-                        )  # stored in github.com/grand-mother/store/releases.
-                    except store.InvalidBLOB:
-                        raise ValueError(
-                            f"missing data for {basename}"
-                        ) from None  # RK: what is this? and why?
-                    else:
-                        with path.open("wb") as f:
-                            f.write(data)
-
-                # ToDo: Add error message if failing to load topography data.
+        tiles = [
+            _tile_name(lat, lon)
+            for lat in range(latitude[0], latitude[1] + 1)
+            for lon in range(longitude[0], longitude[1] + 1)
+        ]
+        _fetch_tiles(tiles, workers, progress)
 
     # Reset the topography proxy
     global _default_topography
     _default_topography = None
 
 
+def _tile_name(latitude: int, longitude: int) -> str:
+    """Get the name of the tile with the given south-west corner."""
+    ns = "S" if latitude < 0 else "N"
+    ew = "W" if longitude < 0 else "E"
+    return f"{ns}{abs(latitude):02d}{ew}{abs(longitude):03d}.{_DEFAULT_MODEL}.hgt"
+
+
+def _print_progress(done: int, total: int, basename: str) -> None:
+    """Default progress report for tiles downloads."""
+    print(f"Cached data for {_CACHEDIR / basename} ({done}/{total})")
+
+
+def _fetch_tiles(
+    tiles: List[str],
+    workers: int = _DOWNLOAD_WORKERS,
+    progress: Optional[Callable[[int, int, str], None]] = None,
+) -> None:
+    """Make tiles available in the topography cache, using a bounded pool of
+    workers.
+
+    Tiles are obtained from the store cache, which verifies their checksum and
+    downloads missing or corrupted ones again. They are exposed to the
+    topography cache as symbolic links to the verified BLOBs, which are pinned
+    in the store cache such that they are never evicted. If symbolic links are
+    not supported, tiles are copied instead, and copies are checked against
+    the BLOB checksum before being reused.
+    """
+    if not tiles:
+        return
+
+    if progress is None:
+        progress = _print_progress
+
+    def fetch(basename: str) -> str:
+        # Data are stored in github.com/grand-mother/store/releases
+        source = store.fetch(basename, pin=True)
+        if not _link_tile(source, _CACHEDIR / basename):
+            # Copies do not depend on the store cache
+            _get_store_cache().unpin(basename)
+        return basename
+
+    total = len(tiles)
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, total))) as executor:
+        futures = {executor.submit(fetch, basename): basename for basename in tiles}
+        try:
+            for done, future in enumerate(as_completed(futures), 1):
+                try:
+                    future.result()
+                except store.InvalidBLOB:
+                    raise ValueError(f"missing data for {futures[future]}") from None
+                progress(done, total, futures[future])
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+
+
+def _link_tile(source: Path, path: Path) -> bool:
+    """Expose a verified tile at *path*, as a symbolic link if possible, or as
+    a copy otherwise. Return True if the tile is linked."""
+    if path.is_symlink():
+        if os.readlink(path) == str(source):
+            return True
+    elif path.exists():
+        stat = path.stat()
+        if (stat.st_size == source.stat().st_size) and (_checksum(path) == source.name):
+            return False
+
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.part")
+    try:
+        os.symlink(source, tmp)
+        linked = True
+    except OSError:
+        shutil.copyfile(source, tmp)
+        linked = False
+    os.replace(tmp, path)
+    return linked
+
+
 def cachedir() -> Path:
     """Get the location of the topography data cache."""
     return _CACHEDIR
@@ -267,6 +368,97 @@ class Topography:
             # TODO: what doing if reference is None ?
             raise ValueError
 
+    def height_above_ground(
+        self,
+        coordinates,
+        chunk_size: int = _CHUNK_SIZE,
+        dtype: Union[str, np.dtype, None] = None,
+    ) -> np.ndarray:
+        """Get the height of the given coordinates above the ground, i.e. the
+        altitude minus the topography elevation, along the local vertical.
+
+        Coordinates can be provided in any frame (ECEF, Geodetic, LTP or
+        GRANDCS). They are converted, and compared to the topography, by
+        chunks of at most *chunk_size* points using preallocated work buffers.
+        Thus, the memory overhead does not depend on the number of points. The
+        result is returned as a float64 array, or float32 if *dtype* requires
+        so. Points outside of the topography data are set to NaN.
+        """
+        dtype = np.dtype(float if dtype is None else dtype)
+        if dtype not in (np.float32, np.float64):
+            raise ValueError(f"invalid dtype {dtype} (expected float32 or float64)")
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be strictly positive")
+
+        if isinstance(coordinates, Geodetic):
+            kind = "geodetic"
+            if coordinates.reference == "ELLIPSOID":
+                geoid = _get_geoid()._map[0]
+            else:
+                geoid = ffi.NULL
+        elif isinstance(coordinates, (ECEF, LTP)):
+            kind = "cartesian"
+            geoid = _get_geoid()._map[0]
+            if isinstance(coordinates, LTP):
+                # Points are transformed from the local frame to ECEF on the
+                # fly, chunk by chunk.
+                basis = np.asarray(coordinates.basis, dtype=float)
+                origin = np.asarray(coordinates.location, dtype=float).reshape(3, 1)
+            else:
+                basis, origin = None, None
+        else:
+            raise TypeError(
+                type(coordinates),
+                "Coordinates must be in ECEF, Geodetic, LTP or GRANDCS.",
+            )
+
+        data = np.asarray(coordinates, dtype=float)
+        n = data.shape[1]
+        height = np.empty(n, dtype=dtype)
+        stack = self._stack._stack[0] if self._stack._stack else ffi.NULL
+
+        # Work buffers, reused for all chunks
+        m = max(min(n, chunk_size), 1)
+        latitude = np.empty(m)
+        longitude = np.empty(m)
+        altitude = np.empty(m)
+        ground = np.empty(m)
+        ecef = np.empty((m, 3)) if kind == "cartesian" else None
+
+        for start in range(0, n, m):
+            stop = min(start + m, n)
+            size = stop - start
+            chunk = data[:, start:stop]
+
+            if kind == "geodetic":
+                latitude[:size] = chunk[0]
+                longitude[:size] = chunk[1]
+                altitude[:size] = chunk[2]
+            else:
+                if basis is not None:
+                    ecef[:size] = (np.matmul(basis.T, chunk) + origin).T
+                else:
+                    ecef[:size] = chunk.T
+                lib.turtle_ecef_to_geodetic_v(
+                    self._as_double_ptr(ecef),
+                    self._as_double_ptr(latitude),
+                    self._as_double_ptr(longitude),
+                    self._as_double_ptr(altitude),
+                    size,
+                )
+
+            lib.grand_topography_global_elevation(
+                stack,
+                geoid,
+                self._as_double_ptr(latitude),
+                self._as_double_ptr(longitude),
+                self._as_double_ptr(ground),
+                size,
+            )
+            np.subtract(altitude[:size], ground[:size], out=height[start:stop], casting="unsafe")
+
+        return height
+
     @staticmethod
     def _as_double_ptr(a):
         a = np.require(a, float, ["CONTIGUOUS", "ALIGNED"])
@@ -260,3 +260,141 @@ void grand_topography_distance(struct turtle_stepper * stepper,
                 }
         }
 }
+
+
+/* Interpolation of tabulated antenna effective lengths
+ *
+ * The complex table has shape (component, frequency, phi, theta), with
+ * interleaved (re, im) float values. Directions are interpolated bilinearly
+ * over the regular (phi, theta) grid, which is periodic along phi. If
+ * frequency is not NULL, the result is also interpolated linearly onto the m
+ * given frequencies, and it vanishes outside of the tabulated ones. Otherwise,
+ * m must be the number of tabulated frequencies. The result is written to
+ * leff, with shape (direction, component, m) of interleaved (re, im) values.
+ */
+int grand_antenna_effective_length(const float * table, long n_component,
+    long n_frequency, long n_phi, long n_theta, const float * table_frequency,
+    double phi0, double dphi, double theta0, double dtheta,
+    const double * phi, const double * theta, long n,
+    const double * frequency, long m, float * leff)
+{
+        /* Precompute the angular offsets and weights, for all directions */
+        long * offset = malloc(4 * n * sizeof(*offset));
+        float * weight = malloc(4 * n * sizeof(*weight));
+        if ((offset == NULL) || (weight == NULL)) {
+                free(offset);
+                free(weight);
+                return -1;
+        }
+
+        long i;
+        for (i = 0; i < n; i++) {
+                /* The theta grid is clamped, while phi is periodic */
+                double rt1 = (theta[i] - theta0) / dtheta;
+                const double ft = floor(rt1);
+                long it0 = ((long)ft) % n_theta;
+                if (it0 < 0) it0 += n_theta;
+                long it1 = it0 + 1;
+                if (it1 == n_theta) {
+                        it1 = it0;
+                        rt1 = 0;
+                } else {
+                        rt1 -= ft;
+                }
+
+                double rp1 = (phi[i] - phi0) / dphi;
+                const double fp = floor(rp1);
+                long ip0 = ((long)fp) % n_phi;
+                if (ip0 < 0) ip0 += n_phi;
+                const long ip1 = (ip0 + 1) % n_phi;
+                rp1 -= fp;
+
+                long * o = offset + 4 * i;
+                o[0] = 2 * (ip0 * n_theta + it0);
+                o[1] = 2 * (ip1 * n_theta + it0);
+                o[2] = 2 * (ip0 * n_theta + it1);
+                o[3] = 2 * (ip1 * n_theta + it1);
+
+                float * w = weight + 4 * i;
+                w[0] = (1 - rp1) * (1 - rt1);
+                w[1] = rp1 * (1 - rt1);
+                w[2] = (1 - rp1) * rt1;
+                w[3] = rp1 * rt1;
+        }
+
+        /* Loop over tabulated (phi, theta) slices, such that the gathered
+         * data stay in cache
+         */
+        const long stride = 2 * n_phi * n_theta; /* Stride of frequencies */
+        long c;
+        for (c = 0; c < n_component; c++) {
+                const float * tc = table + c * n_frequency * stride;
+                long k;
+                for (k = 0; k < m; k++) {
+                        const float * t0, * t1 = NULL;
+                        float w0 = 1, w1 = 0;
+                        if (frequency == NULL) {
+                                t0 = tc + k * stride;
+                        } else {
+                                /* Locate the frequency in the table */
+                                const double x = frequency[k];
+                                if ((n_frequency < 2) ||
+                                    !(x >= table_frequency[0]) ||
+                                    !(x <= table_frequency[n_frequency - 1]))
+                                        t0 = NULL;
+                                else {
+                                        long lo = 0, hi = n_frequency;
+                                        while (lo < hi) {
+                                                const long mid = (lo + hi) / 2;
+                                                if (table_frequency[mid] > x)
+                                                        hi = mid;
+                                                else
+                                                        lo = mid + 1;
+                                        }
+                                        if (lo < 1) lo = 1;
+                                        else if (lo > n_frequency - 1)
+                                                lo = n_frequency - 1;
+
+                                        const double x0 = table_frequency[lo - 1];
+                                        w1 = (x - x0) /
+                                            (table_frequency[lo] - x0);
+                                        w0 = 1 - w1;
+                                        t0 = tc + (lo - 1) * stride;
+                                        t1 = t0 + stride;
+                                }
+                        }
+
+                        float * l = leff + 2 * (c * m + k);
+                        const long step = 2 * n_component * m;
+                        for (i = 0; i < n; i++, l += step) {
+                                const long * o = offset + 4 * i;
+                                const float * w = weight + 4 * i;
+                                float re = 0, im = 0;
+                                int j;
+                                if (t0 == NULL) {
+                                        /* Outside of the tabulated range */
+                                } else if (t1 == NULL) {
+                                        for (j = 0; j < 4; j++) {
+                                                re += w[j] * t0[o[j]];
+                                                im += w[j] * t0[o[j] + 1];
+                                        }
+                                } else {
+                                        for (j = 0; j < 4; j++) {
+                                                re += w[j] * (w0 * t0[o[j]] +
+                                                    w1 * t1[o[j]]);
+                                                im += w[j] * (w0 *
+                                                    t0[o[j] + 1] +
+                                                    w1 * t1[o[j] + 1]);
+                                        }
+                                }
+                                l[0] = re;
+                                l[1] = im;
+                        }
+                }
+        }
+
+        free(offset);
+        free(weight);
+
+        return 0;
+}
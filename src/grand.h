@@ -51,3 +51,10 @@ void grand_topography_local_elevation(struct turtle_stack * stack,
 /* Intersection with the topography */
 void grand_topography_distance(struct turtle_stepper * stepper,
     const double * r, const double * u, double * d, long n);
+
+/* Interpolation of tabulated antenna effective lengths */
+int grand_antenna_effective_length(const float * table, long n_component,
+    long n_frequency, long n_phi, long n_theta, const float * table_frequency,
+    double phi0, double dphi, double theta0, double dtheta,
+    const double * phi, const double * theta, long n,
+    const double * frequency, long m, float * leff);
@@ -4,15 +4,19 @@ Unit tests for the GRAND package
 
 import argparse
 import doctest
+import gzip
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 import os
+import threading
 import unittest
+from unittest import mock
 import sys
 from numbers import Number
 import numpy
 
 from pathlib import Path
 
-__all__ = ["main"]
+__all__ = ["LocalStore", "main"]
 
 
 class TestCase(unittest.TestCase):
@@ -49,6 +53,91 @@ class TestCase(unittest.TestCase):
         self.assertQuantity(a[2], b[2], tol)
 
 
+class LocalStore:
+    """Local HTTP stand-in for the GRAND store, serving gzipped BLOBs
+
+    Byte ranges are supported. Transfer failures can be emulated by setting
+    `faults[name]` to a number of bytes after which the connection is dropped,
+    once. Client connections are recorded by address, in `connections`. The
+    server also acts as an HTTP proxy. Proxied requests are recorded in
+    `proxied`, together with their Proxy-Authorization header.
+    """
+
+    def __init__(self, blobs, tag="101"):
+        self.tag = tag
+        self.blobs = {f"/{tag}/{name}.gz": gzip.compress(data) for name, data in blobs.items()}
+        self.faults = {}
+        self.requests = []
+        self.ranges = []
+        self.connections = set()
+        self.proxied = []
+        self._server = None
+        self._patch = None
+
+    def __enter__(self):
+        store = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                path = self.path
+                if "://" in path:
+                    # Absolute URI, forwarded by a proxy client
+                    store.proxied.append((path, self.headers.get("Proxy-Authorization")))
+                    path = "/" + path.split("://", 1)[1].split("/", 1)[1]
+                store.requests.append(path)
+                store.connections.add(self.client_address)
+                try:
+                    data = store.blobs[path]
+                except KeyError:
+                    self.send_error(404)
+                    return
+
+                start = 0
+                header = self.headers.get("Range")
+                if header is not None:
+                    store.ranges.append((path, header))
+                    start = int(header.split("=")[1].split("-")[0])
+                    self.send_response(206)
+                    self.send_header(
+                        "Content-Range", f"bytes {start}-{len(data) - 1}/{len(data)}"
+                    )
+                else:
+                    self.send_response(200)
+                self.send_header("Content-Type", "application/gzip")
+                self.send_header("Content-Length", str(len(data) - start))
+                self.end_headers()
+
+                name = path[len(store.tag) + 2 : -3]
+                fault = store.faults.pop(name, None)
+                if fault is not None:
+                    self.wfile.write(data[start : start + fault])
+                    self.wfile.flush()
+                    self.close_connection = True
+                    return
+                self.wfile.write(data[start:])
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+        from grand.store import protocol
+
+        host, port = self._server.server_address
+        self._patch = mock.patch.object(protocol, "BASE_URL", f"http://{host}:{port}")
+        self._patch.start()
+        return self
+
+    def __exit__(self, *args):
+        self._patch.stop()
+        self._server.shutdown()
+        self._server.server_close()
+
+
 def main():
     """Run a local test suite"""
 
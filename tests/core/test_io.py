@@ -18,6 +18,7 @@ from grand import (
     Rotation,
     CartesianRepresentation,
     SphericalRepresentation,
+    TimeAxis,
 )
 from tests import TestCase
 
@@ -116,6 +117,7 @@ class IoTest(TestCase):
             "position3": r1,
             "direction0": u0,
             "direction1": u1,
+            "times": TimeAxis(t0=-1e-07, dt=5e-10, n=1000),
             "frame0": ECEF(x=0, y=0, z=0, obstime="2010-01-01"),
             "frame1": LTP(
                 x=0,
@@ -146,6 +148,9 @@ class IoTest(TestCase):
                     self.assertCartesian(a, element)
                 elif isinstance(a, SphericalRepresentation):
                     self.assertSpherical(a, element)
+                elif isinstance(a, TimeAxis):
+                    self.assertIsInstance(element, TimeAxis)
+                    self.assertEqual((a.t0, a.dt, a.n), (element.t0, element.dt, element.n))
                 elif isinstance(a, numpy.ndarray):
                     self.assertEqual(a.shape, element.shape)
                     self.assertArray(a, element)
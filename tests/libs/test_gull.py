@@ -2,9 +2,12 @@
 Unit tests for the grand.libs.gull module
 """
 
+from concurrent.futures import ThreadPoolExecutor
 import os
 import unittest
 
+import numpy
+
 from grand.libs import gull
 from tests import TestCase
 
@@ -52,6 +55,53 @@ class GullTest(TestCase):
             self.assertAlmostEqual(m[i, 1], ref[1], tol)
             self.assertAlmostEqual(m[i, 2], ref[2], tol)
 
+    def test_snapshot_parallel(self):
+        snapshot = gull.Snapshot()
+        n = 100000
+        latitude = numpy.linspace(-80, 80, n)
+        longitude = numpy.linspace(-180, 180, n)
+        altitude = numpy.linspace(0, 10e03, n)
+        serial = snapshot(latitude, longitude, altitude)
+
+        # Check the parallel evaluation mode
+        parallel = snapshot(latitude, longitude, altitude, workers=4)
+        self.assertEqual(parallel.shape, (n, 3))
+        self.assertTrue(numpy.array_equal(parallel, serial))
+
+        # Check that the pool of threads and the workspaces are reused
+        executor0 = gull._executor
+        for workers in (2, 3, 4):
+            snapshot(latitude, longitude, altitude, workers=workers)
+        self.assertIs(gull._executor, executor0)
+        self.assertLessEqual(len(snapshot._workspaces), 4)
+
+        # Check that a snapshot can be shared between threads
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            futures = [
+                executor.submit(snapshot, latitude[i::4], longitude[i::4], altitude[i::4])
+                for i in range(4)
+            ]
+            for i, future in enumerate(futures):
+                self.assertTrue(numpy.array_equal(future.result(), serial[i::4]))
+
+        # Check concurrent parallel evaluations, with various numbers of workers
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            futures = [
+                executor.submit(snapshot, latitude, longitude, altitude, workers=workers)
+                for workers in range(1, 9)
+            ]
+            for future in futures:
+                self.assertTrue(numpy.array_equal(future.result(), serial))
+        self.assertIs(gull._executor, executor0)
+
+        # Check nested evaluations, from threads of the shared pool
+        futures = [
+            gull._get_executor().submit(snapshot, latitude, longitude, altitude, workers=4)
+            for _ in range(2 * gull._POOL_SIZE)
+        ]
+        for future in futures:
+            self.assertTrue(numpy.array_equal(future.result(), serial))
+
     def test_snapshot_error(self):
         with self.assertRaises(gull.LibraryError) as context:
             snapshot = gull.Snapshot("Unknown")
@@ -3,7 +3,10 @@ Unit tests for the grand.simulation.antenna module
 '''
 
 from pathlib import Path
+import tempfile
 import unittest
+from unittest import mock
+import os
 import os.path as osp
 
 
@@ -11,8 +14,12 @@ import numpy
 
 from grand import ECEF, CartesianRepresentation, LTP, Geodetic, GRAND_DATA
 
-from grand.simulation import Antenna, ElectricField, MissingFrameError,        \
+from grand.simulation import Antenna, ElectricField, FFTBackend,               \
+                             MissingFrameError, ProcessingChain, ShowerEvent,  \
                              TabulatedAntennaModel, Voltage
+from grand.simulation.antenna import tabulated
+from grand.simulation.antenna.tabulated import DataTable
+from grand.simulation.shower.generic import CollectionEntry, FieldsCollection
 from tests import TestCase
 
 
@@ -67,8 +74,192 @@ class AntennaTest(TestCase):
         self.assertQuantity(t.phase_theta, tr.phase_theta)
         self.assertQuantity(t.phase_phi, tr.phase_phi)
 
-    def test_antenna(self):
-        ts, delta, Es = 502.5, 5, 100
+    @staticmethod
+    def random_model(seed=0):
+        '''Get a tabulated model with random values'''
+        rng = numpy.random.default_rng(seed)
+        frequency = numpy.linspace(30E+06, 250E+06, 12, dtype='f4')
+        theta = numpy.arange(0, 91, 5, dtype='f4')
+        phi = numpy.arange(0, 360, 5, dtype='f4')
+        shape = (frequency.size, phi.size, theta.size)
+        def amplitude():
+            return rng.uniform(0.5, 1.5, shape).astype('f4')
+        def phase():
+            return rng.uniform(-180, 180, shape).astype('f4')
+        table = DataTable(frequency, theta, phi, amplitude(), amplitude(),
+                          amplitude(), phase(), amplitude(), phase())
+        return TabulatedAntennaModel(table)
+
+    def test_table(self):
+        # Check the precomputed complex tables on a random model
+        model = self.random_model()
+        table = model.table
+        frequency, theta, phi = table.frequency, table.theta, table.phi
+        shape = (frequency.size, phi.size, theta.size)
+        self.assertEqual(model.leff_cartesian.shape, (3, *shape))
+        self.assertEqual(model.leff_cartesian.dtype, numpy.complex64)
+
+        # At a node, the interpolation must match the tabulated values
+        i, j, k = 3, 9, 4
+        x = numpy.array((frequency[i], 0.5 * frequency[0], 1E+09))
+        leff = model._effective_length(theta[k], phi[j], x)
+        self.assertEqual(leff.shape, (3, x.size))
+        lt = table.leff_theta[i, j, k] *                                       \
+             numpy.exp(1j * numpy.deg2rad(table.phase_theta[i, j, k]))
+        lp = table.leff_phi[i, j, k] *                                         \
+             numpy.exp(1j * numpy.deg2rad(table.phase_phi[i, j, k]))
+        t, p = numpy.deg2rad(theta[k]), numpy.deg2rad(phi[j])
+        expected = (
+            lt * numpy.cos(t) * numpy.cos(p) - numpy.sin(p) * lp,
+            lt * numpy.cos(t) * numpy.sin(p) + numpy.cos(p) * lp,
+            -numpy.sin(t) * lt)
+        for l, e in zip(leff[:, 0], expected):
+            self.assertAlmostEqual(l, e, 5)
+
+        # Outside of the tabulated frequencies, the effective length vanishes
+        self.assertTrue(numpy.all(leff[:, 1:] == 0))
+
+    def test_table_grid(self):
+        # Check the resampling onto cached FFT frequency grids
+        model = self.random_model()
+        theta, phi = model.table.theta[4], model.table.phi[9]
+        n, dt = 513, 5E-10
+        leff = model._effective_length_on_grid(theta, phi, n, dt)
+        expected = model._effective_length(theta, phi,
+                                           numpy.fft.fftfreq(n, dt))
+        self.assertEqual(leff.shape, (3, n))
+        self.assertTrue(numpy.allclose(leff, expected, atol=1E-06))
+        band, table = model._resampled(n, dt)
+        self.assertIs(model._resampled(n, dt)[1], table)
+
+    def test_table_grid_cache(self):
+        # The cache of grids is bounded by size, with LRU eviction
+        model = self.random_model()
+        n, dt = 513, 5E-10
+        band, table = model._resampled(n, dt)
+        with mock.patch.object(tabulated, '_GRIDS_NBYTES', 4 * table.nbytes):
+            for i in range(20):
+                model._resampled(n + i + 1, dt)
+                self.assertLessEqual(model._grids_nbytes, 4 * table.nbytes)
+                self.assertEqual(model._grids_nbytes, sum(
+                    v.nbytes for _, v in model._grids.values()))
+            self.assertIn((n + 20, dt), model._grids)
+            self.assertIsNot(model._resampled(n, dt)[1], table)
+
+            # Tables larger than the cache are not stored
+            model._resampled(8 * n, dt)
+            self.assertNotIn((8 * n, dt), model._grids)
+
+    def test_table_directions(self):
+        # Check the vectorized interpolation over many directions
+        model = self.random_model()
+        frequency, theta, phi = (model.table.frequency, model.table.theta,
+                                 model.table.phi)
+        rng = numpy.random.default_rng(1)
+        jj = rng.integers(0, phi.size, 50)
+        kk = rng.integers(0, theta.size, 50)
+        leff = model.effective_lengths(theta[kk], phi[jj], frequency)
+        self.assertEqual(leff.shape, (kk.size, 3, frequency.size))
+        expected = numpy.moveaxis(model.leff_cartesian[:, :, jj, kk], -1, 0)
+        self.assertTrue(numpy.allclose(leff, expected, atol=1E-06))
+
+        th = rng.uniform(0, 90, 50)
+        ph = rng.uniform(-180, 180, 50)
+        leff = model.effective_lengths(th, ph, frequency)
+        self.assertTrue(numpy.allclose(
+            leff, model.effective_lengths(th, ph + 360, frequency),
+            atol=1E-06))
+        out = numpy.empty((th.size, 3, frequency.size), numpy.complex64)
+        self.assertIs(model.effective_lengths(th, ph, frequency, out=out), out)
+        self.assertTrue(numpy.all(out == leff))
+        with self.assertRaises(ValueError):
+            model.effective_lengths(th, ph, frequency, out=out[:, :2])
+
+        n, dt = 513, 5E-10
+        leff = model._effective_lengths_on_grid(th, ph, n, dt)
+        self.assertEqual(leff.shape, (th.size, 3, n))
+        expected = model._effective_length_on_grid(th[3], ph[3], n, dt)
+        self.assertTrue(numpy.allclose(leff[3], expected))
+
+    def test_table_arms(self):
+        # Check multi-arm models
+        model, other = self.random_model(0), self.random_model(1)
+        stacked = TabulatedAntennaModel.stack({'SN': model, 'EW': other})
+        self.assertEqual(stacked.arms, ('SN', 'EW'))
+        shape = model.leff_cartesian.shape[1:]
+        self.assertEqual(stacked.leff_cartesian.shape, (6, *shape))
+        self.assertTrue(numpy.all(
+            stacked.leff_cartesian[:3] == model.leff_cartesian))
+        self.assertTrue(numpy.all(
+            stacked.leff_cartesian[3:] == other.leff_cartesian))
+
+        th, ph = numpy.array((10., 45.)), numpy.array((0., 95.))
+        n, dt = 513, 5E-10
+        leff = stacked._effective_lengths_on_grid(th, ph, n, dt)
+        self.assertEqual(leff.shape, (th.size, 6, n))
+
+        other.table.theta = other.table.theta + 1
+        with self.assertRaises(ValueError):
+            TabulatedAntennaModel.stack({'SN': model, 'EW': other})
+
+    def test_table_cache(self):
+        # Converted models are memory mapped on subsequent loads
+        stacked = TabulatedAntennaModel.stack(
+            {'SN': self.random_model(0), 'EW': self.random_model(1)})
+        stacked.dump(self.path)
+        with tempfile.TemporaryDirectory() as tmpdir, mock.patch.object(
+            tabulated, '_CACHEDIR', Path(tmpdir)):
+            for _ in range(2):
+                loaded = TabulatedAntennaModel.load(self.path)
+                self.assertEqual(loaded.arms, stacked.arms)
+                self.assertTrue(numpy.allclose(
+                    loaded.leff_cartesian, stacked.leff_cartesian, atol=1E-06))
+
+            # The second load must memory map the converted model
+            self.assertEqual(len(list(Path(tmpdir).glob('antenna.*'))), 1)
+            self.assertIsInstance(loaded.leff_cartesian, numpy.memmap)
+            self.assertIsInstance(loaded.table.leff_theta, numpy.memmap)
+
+            th, ph = numpy.array((10., 45.)), numpy.array((0., 95.))
+            n, dt = 513, 5E-10
+            leff = loaded._effective_lengths_on_grid(th, ph, n, dt)
+            self.assertTrue(numpy.allclose(
+                leff, stacked._effective_lengths_on_grid(th, ph, n, dt),
+                atol=1E-06))
+
+    def test_table_cache_key(self):
+        # The cache is keyed by content. Touched files still hit it, while
+        # rewritten ones are converted again. Content hashes are memoized
+        # until the file size or its modification time changes
+        model = self.random_model()
+        stacked = TabulatedAntennaModel.stack({'SN': model, 'EW': model})
+        stacked.dump(self.path)
+        with tempfile.TemporaryDirectory() as tmpdir, mock.patch.object(
+            tabulated, '_CACHEDIR', Path(tmpdir)):
+            TabulatedAntennaModel.load(self.path)
+            with mock.patch.object(tabulated, '_digest',
+                                   wraps=tabulated._digest) as digest:
+                TabulatedAntennaModel.load(self.path)
+                self.assertEqual(digest.call_count, 0)
+
+                stat = os.stat(self.path)
+                os.utime(self.path,
+                         ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+                TabulatedAntennaModel.load(self.path)
+                self.assertEqual(digest.call_count, 1)
+                self.assertEqual(
+                    len(list(Path(tmpdir).glob('antenna.*'))), 1)
+
+                model.dump(self.path)
+                os.utime(self.path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+                reloaded = TabulatedAntennaModel.load(self.path)
+                self.assertEqual(digest.call_count, 2)
+            self.assertIsNone(reloaded.arms)
+            self.assertEqual(len(list(Path(tmpdir).glob('antenna.*'))), 2)
+
+    def shower(self):
+        '''Get the test electric field, Xmax, and the shower and antenna
+        frames'''
         t = numpy.array([-6.5e-08, -6.3e-08, -6.1e-08, -5.9e-08, -5.7e-08, -5.5e-08, 
             -5.3e-08, -5.1e-08, -4.9e-08, -4.7e-08, -4.5e-08, -4.3e-08, -4.1e-08, 
             -3.9e-08, -3.7e-08, -3.5e-08, -3.3e-08, -3.1e-08, -2.9e-08, -2.7e-08, 
@@ -202,16 +393,22 @@ class AntennaTest(TestCase):
         shower_frame  = LTP(x=0,y=0,z=0,location=loc, orientation='NWU', declination=0.72)
         antenna_frame = LTP(x=0,y=0,z=0,location=ant_loc, orientation='NWU', declination=0.72)
         xmax = LTP(x=150750., y=0, z=15560., frame=shower_frame)
-        def check(voltage):
-            imin, imax = numpy.argmin(voltage.V), numpy.argmax(voltage.V)
-            t0 = 0.5 * (voltage.t[imax] + voltage.t[imin])
-            Vpp = voltage.V[imax] - voltage.V[imin]
-            self.assertLess(t0 - ts, delta)
-            self.assertGreater(Vpp, 6E-02 * Es)
-
         field   = ElectricField(t, E, frame=shower_frame)
+        return field, xmax, shower_frame, antenna_frame
+
+    def check(self, voltage):
+        '''Check the peak time and amplitude of a voltage'''
+        ts, delta, Es = 502.5, 5, 100
+        imin, imax = numpy.argmin(voltage.V), numpy.argmax(voltage.V)
+        t0 = 0.5 * (voltage.t[imax] + voltage.t[imin])
+        Vpp = voltage.V[imax] - voltage.V[imin]
+        self.assertLess(t0 - ts, delta)
+        self.assertGreater(Vpp, 6E-02 * Es)
+
+    def test_antenna(self):
+        field, xmax, shower_frame, antenna_frame = self.shower()
         antenna = Antenna(model=self.model, frame=antenna_frame)
-        check(antenna.compute_voltage(xmax, field, shower_frame))
+        self.check(antenna.compute_voltage(xmax, field, shower_frame))
         with self.assertRaises(MissingFrameError) as context:
             antenna.compute_voltage(xmax, field)
 
@@ -220,7 +417,7 @@ class AntennaTest(TestCase):
             antenna.compute_voltage(xmax, field, shower_frame)
 
         antenna = Antenna(model=self.model, frame=antenna_frame)
-        check(antenna.compute_voltage(xmax, field, shower_frame))
+        self.check(antenna.compute_voltage(xmax, field, shower_frame))
         with self.assertRaises(MissingFrameError) as context:
             antenna.compute_voltage(xmax, field)
 
@@ -231,6 +428,101 @@ class AntennaTest(TestCase):
         effective_length = antenna.effective_length(xmax, field, shower_frame)
         self.assertIsInstance(effective_length, CartesianRepresentation)
 
+    def test_single_precision(self):
+        field, xmax, shower_frame, antenna_frame = self.shower()
+        antenna = Antenna(model=self.model, frame=antenna_frame)
+
+        # Check the single precision effective length
+        effective_length = antenna.effective_length(xmax, field, shower_frame)
+        leff4 = antenna.effective_length(xmax, field, shower_frame, dtype='f4')
+        self.assertIsInstance(leff4, CartesianRepresentation)
+        self.assertEqual(leff4.dtype, numpy.float32)
+        self.assertTrue(numpy.allclose(leff4, effective_length, rtol=1E-05,
+            atol=1E-05 * numpy.max(numpy.abs(effective_length))))
+
+        # Check the single precision voltage
+        voltage = antenna.compute_voltage(xmax, field, shower_frame)
+        v4 = antenna.compute_voltage(xmax, field, shower_frame, dtype='f4')
+        self.assertEqual(v4.V.dtype, numpy.float32)
+        self.assertLess(numpy.max(numpy.abs(v4.V - voltage.V)),
+                        1E-05 * numpy.max(numpy.abs(voltage.V)))
+
+    def test_fft_backend(self):
+        field, xmax, shower_frame, antenna_frame = self.shower()
+        antenna = Antenna(model=self.model, frame=antenna_frame)
+        voltage = antenna.compute_voltage(xmax, field, shower_frame)
+        self.assertEqual(voltage.t.size, field.t.size)
+        for fft in (FFTBackend('numpy'), FFTBackend(workers=2),
+                    FFTBackend(pad=True)):
+            v = antenna.compute_voltage(xmax, field, shower_frame, fft=fft)
+            self.assertEqual(v.t.size, field.t.size)
+            self.check(v)
+            if not fft.pad:
+                self.assertQuantity(v.V, voltage.V, 6)
+        with self.assertRaises(ValueError):
+            FFTBackend('fftw')
+
+    def test_odd_trace(self):
+        # Odd traces lose their last sample, with or without padding
+        field, xmax, shower_frame, antenna_frame = self.shower()
+        antenna = Antenna(model=self.model, frame=antenna_frame)
+        t, E = field.t, field.E
+        odd = ElectricField(t[:-1], CartesianRepresentation(
+            x=E.x[:-1], y=E.y[:-1], z=E.z[:-1]), frame=shower_frame)
+        for fft in (None, FFTBackend(pad=True)):
+            v = antenna.compute_voltage(xmax, odd, shower_frame, fft=fft)
+            self.assertEqual(v.V.size, t.size - 2)
+            self.assertEqual(v.t.size, t.size - 2)
+
+    def test_processing_chain(self):
+        field, xmax, shower_frame, antenna_frame = self.shower()
+        antenna = Antenna(model=self.model, frame=antenna_frame)
+        voltage = antenna.compute_voltage(xmax, field, shower_frame)
+        t = field.t
+
+        chain = ProcessingChain(transfers=(lambda f: 2 * numpy.ones_like(f),))
+        v = antenna.compute_voltage(xmax, field, shower_frame, chain=chain)
+        self.assertQuantity(v.V, 2 * voltage.V, 6)
+        chain = ProcessingChain(band=(0, 1 / (t[1] - t[0])), decimation=2)
+        v = antenna.compute_voltage(xmax, field, shower_frame, chain=chain)
+        self.assertEqual(v.V.size, (t.size + 1) // 2)
+        self.assertQuantity(v.t, t[::2])
+        for kwargs in ({'band': (2, 1)}, {'decimation': 0}):
+            with self.assertRaises(ValueError):
+                ProcessingChain(**kwargs)
+
+    def test_shower_voltages(self):
+        # Check the batched computation over a shower event
+        field, xmax, shower_frame, antenna_frame = self.shower()
+        antenna = Antenna(model=self.model, frame=antenna_frame)
+        voltage = antenna.compute_voltage(xmax, field, shower_frame)
+        t, E = field.t, field.E
+
+        fields = FieldsCollection()
+        fields[0] = CollectionEntry(ElectricField(t, E))
+        fields[1] = CollectionEntry(ElectricField(t, 2 * E))
+        shower = ShowerEvent(frame=shower_frame, maximum=xmax, fields=fields)
+        shower.compute_voltages(self.model, (antenna_frame, antenna_frame))
+        self.assertQuantity(fields[0].voltage.t, voltage.t)
+        self.assertQuantity(fields[0].voltage.V, voltage.V, 6)
+        self.assertQuantity(fields[1].voltage.V, 2 * voltage.V, 6)
+
+    def test_antenna_arms(self):
+        # Check multi-arm models
+        field, xmax, shower_frame, antenna_frame = self.shower()
+        antenna = Antenna(model=self.model, frame=antenna_frame)
+        voltage = antenna.compute_voltage(xmax, field, shower_frame)
+
+        model = TabulatedAntennaModel.stack({'SN': self.model,
+                                             'EW': self.model})
+        antenna = Antenna(model=model, frame=antenna_frame)
+        voltages = antenna.compute_voltages(xmax, field, shower_frame)
+        self.assertEqual(tuple(voltages), ('SN', 'EW'))
+        for v in voltages.values():
+            self.assertQuantity(v.V, voltage.V, 6)
+        with self.assertRaises(ValueError):
+            antenna.compute_voltage(xmax, field, shower_frame)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -5,14 +5,15 @@ Unit tests for the grand.simulation.shower module
 from collections import OrderedDict
 from pathlib import Path
 import tarfile
+import tempfile
 import unittest
 
 import numpy
 
-from grand import store, io, LTP, CartesianRepresentation, SphericalRepresentation
-from grand.simulation import CoreasShower, ElectricField, ShowerEvent, ZhairesShower
+from grand import store, io, LTP, CartesianRepresentation, SphericalRepresentation, TimeAxis
+from grand.simulation import CoreasShower, ElectricField, ShowerEvent, Voltage, ZhairesShower
 from grand.simulation.pdg import ParticleCode
-from grand.simulation.shower.generic import CollectionEntry
+from grand.simulation.shower.generic import CollectionEntry, FieldsCollection
 from tests import TestCase
 
 
@@ -47,7 +48,7 @@ class ShowerTest(TestCase):
         self.assertEqual(b.voltage, None)
         a, b = a.electric, b.electric
         self.assertCartesian(a.r, b.r, 4)
-        self.assertQuantity(a.t, b.t, 7)
+        self.assertQuantity(numpy.asarray(a.t), numpy.asarray(b.t), 7)
         self.assertCartesian(a.E, b.E, 5)
 
     def test_generic(self):
@@ -96,6 +97,154 @@ class ShowerTest(TestCase):
 
         compare_showers()
 
+    def test_fields(self):
+        def electric(n, r=None):
+            E = numpy.arange(3 * n, dtype="f8").reshape(3, n)
+            E = CartesianRepresentation(x=E[0], y=E[1], z=E[2])
+            return ElectricField(numpy.arange(n) * 1e-09, E, r)
+
+        r = CartesianRepresentation(x=1, y=2, z=3)
+        fields = FieldsCollection([(5, CollectionEntry(electric(4, r))),
+                                   (2, CollectionEntry(electric(6)))])
+        fields[7] = CollectionEntry()
+        self.assertEqual(list(fields), [5, 2, 7])
+        self.assertEqual(dict(fields.index), {5: 0, 2: 1, 7: 2})
+        self.assertArray(fields.antennas, numpy.array((5, 2, 7)))
+
+        # Traces are stored by column, and zero padded
+        self.assertEqual(fields.E.shape, (3, 3, 6))
+        self.assertArray(fields.E[0, :, :4], electric(4).E)
+        self.assertArray(fields.E[0, :, 4:], numpy.zeros((3, 2)))
+        self.assertEqual(fields.r.shape, (3, 3))
+        self.assertArray(fields.r[:, 0], numpy.array((1, 2, 3)))
+        self.assertTrue(numpy.isnan(fields.r[:, 1:]).all())
+        self.assertIsNone(fields.V)
+
+        # Entries are views of a row
+        self.assertField(fields[5], CollectionEntry(electric(4, r)))
+        self.assertIsNone(fields[2].electric.r)
+        self.assertIsNone(fields[7].electric)
+        fields[5].electric.E.x[0] = -1
+        self.assertEqual(fields.E[0, 0, 0], -1)
+
+        V = numpy.ones(6)
+        fields[2].voltage = Voltage(fields[2].electric.t, V)
+        self.assertEqual(fields.V.shape, (3, 6))
+        self.assertArray(fields[2].voltage.V, V)
+        self.assertIsNone(fields[5].voltage)
+        with self.assertRaises(ValueError):
+            fields[5].voltage = Voltage(fields[5].electric.t, numpy.ones((2, 4)))
+        with self.assertRaises(ValueError):
+            fields[8] = CollectionEntry(voltage=Voltage(V, numpy.ones((2, 6))))
+        self.assertNotIn(8, fields)
+
+        # A failed overwrite leaves the entry unchanged
+        with self.assertRaises(ValueError):
+            fields[5] = CollectionEntry(electric(8), Voltage(V, numpy.ones((2, 6))))
+        self.assertEqual(fields[5].electric.t.size, 4)
+        self.assertEqual(fields.E.shape, (3, 3, 6))
+        self.assertEqual(fields.E[0, 0, 0], -1)
+        self.assertIsNone(fields[5].voltage)
+
+        del fields[5]
+        self.assertEqual(dict(fields.index), {2: 0, 7: 1})
+        self.assertArray(fields[2].voltage.V, V)
+        with self.assertRaises(KeyError):
+            fields[5]
+
+        # Deleted rows are cleared, and do not leak into new entries
+        self.assertArray(fields._E[2], numpy.zeros((3, 6)))
+        fields[9] = CollectionEntry(electric(2, r), Voltage(numpy.arange(2), numpy.ones(2)))
+        del fields[2], fields[7]
+        self.assertEqual(list(fields), [9])
+        self.assertArray(fields.E[0, :, :2], electric(2).E)
+        self.assertArray(fields._E[1:3], numpy.zeros((2, 3, 6)))
+        self.assertArray(fields._V[1:3], numpy.zeros((2, 6)))
+        self.assertTrue(numpy.isnan(fields._r[:, 1:3]).all())
+        fields[2] = CollectionEntry(electric(6))
+        self.assertArray(fields.V[1], numpy.zeros(6))
+        self.assertTrue(numpy.isnan(fields.r[:, 1]).all())
+        del fields[9]
+        fields[2].voltage = Voltage(fields[2].electric.t, V)
+        fields[7] = CollectionEntry()
+
+        # Fields are dumped and loaded by antenna
+        shower = ShowerEvent(fields=fields)
+        shower.dump(self.path)
+        tmp = ShowerEvent.load(self.path)
+        self.assertIsInstance(tmp.fields, FieldsCollection)
+        self.assertEqual(list(tmp.fields), [2, 7])
+        self.assertQuantity(tmp.fields[2].electric.E.y, fields[2].electric.E.y, 6)
+        self.assertQuantity(tmp.fields[2].voltage.V, V, 6)
+
+        # Fields can be loaded on access
+        tmp = ShowerEvent.load(self.path, lazy=True)
+        self.assertEqual(list(tmp.fields), [2, 7])
+        self.assertEqual(tmp.fields.deferred, [2, 7])
+        self.assertQuantity(tmp.fields[2].voltage.V, V, 6)
+        self.assertEqual(tmp.fields.deferred, [7])
+        self.assertEqual(tmp.fields.E.shape, (2, 3, 6))
+        self.assertEqual(tmp.fields.deferred, [])
+
+        # Antennas and samples can be selected when loading
+        tmp = ShowerEvent.load(self.path, antennas=[2])
+        self.assertEqual(list(tmp.fields), [2])
+        tmp = ShowerEvent.load(self.path, region=lambda r: r[2] > 0)
+        self.assertEqual(list(tmp.fields), [])  # positions are unknown
+        tmp = ShowerEvent.load(self.path, lazy=True, time_window=(1.5e-09, 3.5e-09))
+        self.assertEqual(list(tmp.fields), [2, 7])
+        self.assertQuantity(tmp.fields[2].electric.E.y, numpy.array((8, 9)))
+        self.assertEqual(tmp.fields[2].voltage.V.shape, (2,))
+
+        # Field values can be loaded in single precision
+        for lazy in (False, True):
+            tmp = ShowerEvent.load(self.path, lazy=lazy, dtype="f4")
+            self.assertEqual(tmp.fields[2].electric.E.dtype, numpy.float32)
+            self.assertEqual(tmp.fields[2].voltage.V.dtype, numpy.float32)
+            self.assertQuantity(tmp.fields[2].voltage.V, V, 6)
+
+        # Empty windows yield empty traces, not missing ones
+        tmp = ShowerEvent.load(self.path, time_window=(1.0, 2.0))
+        self.assertEqual(list(tmp.fields), [2, 7])
+        self.assertEqual(tmp.fields[2].electric.E.shape, (3, 0))
+        self.assertEqual(tmp.fields[2].voltage.V.shape, (0,))
+        self.assertIsNone(tmp.fields[7].electric)
+        tmp.dump(self.path)
+        tmp = ShowerEvent.load(self.path)
+        self.assertEqual(tmp.fields[2].electric.E.shape, (3, 0))
+
+    def test_trace_times(self):
+        # Regular times of simulation traces are only compressed on request
+        t = numpy.arange(10) * 5e-10
+        irregular = t.copy()
+        irregular[5] += 1e-10
+        E = numpy.arange(30.).reshape(10, 3)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for load, scale in (
+                (CoreasShower._load_trace, 1),
+                (ZhairesShower._load_trace, 1e09),
+            ):
+                path = Path(tmpdir) / "trace.dat"
+                numpy.savetxt(path, numpy.column_stack((irregular * scale, E)))
+                for compress in (False, True):
+                    electric = load(9, path, None, compress=compress).electric
+                    self.assertNotIsInstance(electric.t, TimeAxis)
+                    self.assertEqual(electric.t.size, t.size)
+
+                numpy.savetxt(path, numpy.column_stack((t * scale, E)))
+                electric = load(9, path, None).electric
+                self.assertNotIsInstance(electric.t, TimeAxis)
+                electric = load(9, path, None, compress=True).electric
+                self.assertIsInstance(electric.t, TimeAxis)
+                self.assertEqual(electric.t.size, t.size)
+
+        # Irregular times are dumped and loaded as is
+        fields = FieldsCollection()
+        fields[9] = CollectionEntry(ElectricField(irregular, E.T.copy()))
+        ShowerEvent(fields=fields).dump(self.path)
+        tmp = ShowerEvent.load(self.path)
+        self.assertQuantity(numpy.asarray(tmp.fields[9].electric.t), irregular)
+
     def test_coreas(self):
         path = self.get_data("coreas")
         shower = ShowerEvent.load(path)
@@ -108,6 +257,22 @@ class ShowerTest(TestCase):
         a, b = shower.fields[9], tmp.fields[9]
         self.assertField(a, b)
 
+        tmp = CoreasShower.load(path, lazy=True)
+        self.assertEqual(list(tmp.fields), list(shower.fields))
+        self.assertField(shower.fields[9], tmp.fields[9])
+
+        # Time windows are in s, while CoREAS times are loaded in ns
+        t = numpy.asarray(shower.fields[9].electric.t) * 1e-09
+        window = (0.5 * (t[9] + t[10]), 0.5 * (t[19] + t[20]))
+        tmp = CoreasShower.load(path, antennas=[9], time_window=window)
+        self.assertEqual(tmp.fields[9].electric.t.size, 10)
+
+        tmp = CoreasShower.load(path, antennas=[9], dtype="f4")
+        self.assertEqual(tmp.fields[9].electric.E.dtype, numpy.float32)
+        self.assertTrue(numpy.allclose(
+            tmp.fields[9].electric.E, shower.fields[9].electric.E, rtol=1e-06, atol=0
+        ))
+
         pos0 = CoreasShower._parse_coreas_bins(path, 9000)
         pos1 = CoreasShower._parse_list(path, 9000)
         self.assertIsNotNone(pos0)
@@ -135,6 +300,21 @@ class ShowerTest(TestCase):
         a, b = shower.fields[9], tmp.fields[9]
         self.assertField(a, b)
 
+        tmp = ZhairesShower.load(path, lazy=True)
+        self.assertEqual(list(tmp.fields), list(shower.fields))
+        self.assertField(shower.fields[9], tmp.fields[9])
+
+        t = numpy.asarray(shower.fields[9].electric.t)
+        window = (0.5 * (t[9] + t[10]), 0.5 * (t[19] + t[20]))
+        tmp = ZhairesShower.load(path, antennas=[9], time_window=window)
+        self.assertEqual(tmp.fields[9].electric.t.size, 10)
+
+        tmp = ZhairesShower.load(path, antennas=[9], dtype="f4")
+        self.assertEqual(tmp.fields[9].electric.E.dtype, numpy.float32)
+        self.assertTrue(numpy.allclose(
+            tmp.fields[9].electric.E, shower.fields[9].electric.E, rtol=1e-06, atol=0
+        ))
+
         frame = shower.shower_frame()
         ev = shower.core - shower.maximum
         ev /= numpy.linalg.norm(ev)
@@ -0,0 +1,116 @@
+"""
+Unit tests for the grand.store.cache module
+"""
+
+import hashlib
+from pathlib import Path
+import tempfile
+import unittest
+
+from grand.store.cache import Cache
+from grand.store.protocol import InvalidBLOB
+from tests import LocalStore, TestCase
+
+
+class CacheTest(TestCase):
+    """Unit tests for the cache module"""
+
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.path = Path(self._tmpdir.name)
+
+    def tearDown(self):
+        self._tmpdir.cleanup()
+
+    def test_get(self):
+        blobs = {"a.bin": b"a" * 1000, "b.bin": b"b" * 2000, "c.bin": b"a" * 1000}
+        with LocalStore(blobs) as local:
+            cache = Cache(self.path)
+            path = cache.get("a.bin")
+            self.assertEqual(path.read_bytes(), blobs["a.bin"])
+            self.assertEqual(path.name, hashlib.sha256(blobs["a.bin"]).hexdigest())
+
+            # Check that cached BLOBs are not fetched again, including from
+            # another cache instance sharing the same index
+            n = len(local.requests)
+            self.assertEqual(cache.get("a.bin"), path)
+            self.assertEqual(Cache(self.path).get("a.bin"), path)
+            self.assertEqual(len(local.requests), n)
+
+            # Check that identical contents are stored once
+            self.assertEqual(cache.get("c.bin"), path)
+            self.assertEqual(cache.size, 1000)
+            cache.get("b.bin")
+            self.assertEqual(cache.size, 3000)
+            entries = cache.entries()
+            self.assertEqual(len(entries), 3)
+            self.assertEqual(entries[-1].name, "b.bin")
+            self.assertEqual(entries[-1].size, 2000)
+
+            with self.assertRaises(InvalidBLOB) as context:
+                cache.get("toto")
+
+    def test_verify(self):
+        blobs = {"a.bin": b"a" * 1000}
+        with LocalStore(blobs) as local:
+            cache = Cache(self.path)
+            path = cache.get("a.bin")
+
+            # Check that a corrupted BLOB is detected and fetched again
+            path.write_bytes(b"b" * 1000)
+            n = len(local.requests)
+            path = cache.get("a.bin")
+            self.assertEqual(path.read_bytes(), blobs["a.bin"])
+            self.assertEqual(len(local.requests), n + 1)
+
+            # Idem for a partial BLOB
+            path.write_bytes(b"a" * 10)
+            path = cache.get("a.bin")
+            self.assertEqual(path.read_bytes(), blobs["a.bin"])
+            self.assertEqual(len(local.requests), n + 2)
+
+    def test_evict(self):
+        blobs = {"a.bin": b"a" * 1000, "b.bin": b"b" * 1000, "c.bin": b"c" * 1000}
+        with LocalStore(blobs):
+            cache = Cache(self.path, budget=2500)
+            a = cache.get("a.bin")
+            b = cache.get("b.bin")
+            cache.get("a.bin")
+            c = cache.get("c.bin")
+
+            # The least recently used BLOB (b) has been evicted
+            self.assertTrue(a.exists())
+            self.assertFalse(b.exists())
+            self.assertTrue(c.exists())
+            self.assertEqual({e.name for e in cache.entries()}, {"a.bin", "c.bin"})
+
+            freed = cache.evict(budget=1000)
+            self.assertEqual(freed, 1000)
+            self.assertFalse(a.exists())
+
+            cache.clear()
+            self.assertEqual(cache.size, 0)
+            self.assertEqual(cache.entries(), [])
+
+    def test_pin(self):
+        blobs = {"a.bin": b"a" * 1000, "b.bin": b"b" * 1000, "c.bin": b"c" * 1000}
+        with LocalStore(blobs):
+            cache = Cache(self.path, budget=2000)
+            a = cache.get("a.bin", pin=True)
+            b = cache.get("b.bin")
+            cache.get("c.bin")
+
+            # Pinned BLOBs are never evicted
+            self.assertTrue(a.exists())
+            self.assertFalse(b.exists())
+            cache.clear()
+            self.assertTrue(a.exists())
+            self.assertEqual(cache.size, 1000)
+
+            cache.unpin("a.bin")
+            cache.clear()
+            self.assertFalse(a.exists())
+
+
+if __name__ == "__main__":
+    unittest.main()
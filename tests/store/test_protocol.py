@@ -2,10 +2,17 @@
 Unit tests for the grand.store.protocol module
 """
 
+import base64
+import io
+import os
+from pathlib import Path
+import tempfile
 import unittest
+from unittest import mock
 
-from grand.store.protocol import InvalidBLOB, get
-from tests import TestCase
+from grand.store import protocol
+from grand.store.protocol import InvalidBLOB, download, get, get_many, stream
+from tests import LocalStore, TestCase
 
 
 class ProtocolTest(TestCase):
@@ -20,6 +27,92 @@ class ProtocolTest(TestCase):
         with self.assertRaises(InvalidBLOB) as context:
             blob = get("toto")
 
+    def test_download(self):
+        blob = bytes(range(256)) * 10000
+        with LocalStore({"blob.bin": blob}), tempfile.TemporaryDirectory() as tmpdir:
+            path = Path(tmpdir) / "blob.bin"
+            size = download("blob.bin", path)
+            self.assertEqual(size, len(blob))
+            self.assertEqual(path.read_bytes(), blob)
+
+            # A failed transfer leaves no file behind
+            path = Path(tmpdir) / "toto"
+            with self.assertRaises(InvalidBLOB) as context:
+                download("toto", path)
+            self.assertFalse(path.exists())
+            self.assertEqual([p.name for p in Path(tmpdir).iterdir()], ["blob.bin"])
+
+            # Local I/O errors are wrapped as well
+            path = Path(tmpdir) / "missing" / "blob.bin"
+            with self.assertRaises(InvalidBLOB) as context:
+                download("blob.bin", path)
+            self.assertIsInstance(context.exception.__cause__, OSError)
+
+    def test_get_many(self):
+        blobs = {f"blob{i}.bin": bytes([i]) * (1000 * i) for i in range(20)}
+        with LocalStore(blobs) as local:
+            results = dict(get_many(blobs, workers=4))
+            self.assertEqual(results, blobs)
+            self.assertEqual(len(local.requests), len(blobs))
+
+            # Check that connections are reused
+            self.assertLessEqual(len(local.connections), 4)
+
+            # Check the failure case
+            with self.assertRaises(InvalidBLOB) as context:
+                dict(get_many(["blob1.bin", "toto"], workers=2))
+
+    def test_proxy(self):
+        blob = bytes(range(256)) * 10000
+        with LocalStore({"blob.bin": blob}) as local:
+            host, port = local._server.server_address
+            proxy = f"http://user:pa%40ss@{host}:{port}"
+            environ = {"http_proxy": proxy, "no_proxy": ""}
+            with mock.patch.dict(os.environ, environ), mock.patch.object(
+                protocol, "BASE_URL", "http://grand-store.invalid"
+            ):
+                # Requests are forwarded by the proxy
+                self.assertEqual(get("blob.bin"), blob)
+                self.assertEqual(len(local.proxied), 1)
+                uri, authorization = local.proxied[0]
+                self.assertEqual(uri, "http://grand-store.invalid/101/blob.bin.gz")
+                credentials = base64.b64encode(b"user:pa@ss").decode()
+                self.assertEqual(authorization, f"Basic {credentials}")
+
+                # Proxied transfers are resumed as well
+                local.faults["blob.bin"] = 1000
+                self.assertEqual(get("blob.bin"), blob)
+                self.assertEqual(local.ranges[-1][1], "bytes=1000-")
+
+            # Hosts listed in NO_PROXY are reached directly
+            environ = {"http_proxy": "http://grand-proxy.invalid:3128", "no_proxy": host}
+            with mock.patch.dict(os.environ, environ):
+                n = len(local.proxied)
+                self.assertEqual(get("blob.bin"), blob)
+                self.assertEqual(len(local.proxied), n)
+
+    def test_stream(self):
+        blob = bytes(range(256)) * 10000
+        with LocalStore({"blob.bin": blob}) as local:
+            sink = io.BytesIO()
+            size = stream("blob.bin", sink, chunk_size=1024)
+            self.assertEqual(size, len(blob))
+            self.assertEqual(sink.getvalue(), blob)
+            self.assertEqual(local.ranges, [])
+
+            # Check that failed transfers are resumed
+            local.faults["blob.bin"] = 1000
+            sink = io.BytesIO()
+            size = stream("blob.bin", sink, chunk_size=128)
+            self.assertEqual(sink.getvalue(), blob)
+            self.assertEqual(len(local.ranges), 1)
+            self.assertEqual(local.ranges[0][1], "bytes=1000-")
+
+            # Check that the number of retries is bounded
+            local.faults["blob.bin"] = 1000
+            with self.assertRaises(InvalidBLOB) as context:
+                stream("blob.bin", io.BytesIO(), retries=0)
+
 
 if __name__ == "__main__":
     unittest.main()
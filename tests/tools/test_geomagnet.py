@@ -2,6 +2,8 @@
 Unit tests for the grand.tools.geomagnet module
 """
 
+import os
+import tempfile
 import unittest
 
 import numpy
@@ -18,7 +20,7 @@ from grand.tools.coordinates import (
     CartesianRepresentation,
     ECEF,
 )
-from grand.tools.geomagnet import Geomagnet
+from grand.tools.geomagnet import Geomagnet, Lattice
 from tests import TestCase
 
 
@@ -142,6 +144,74 @@ class GeomagnetTest(TestCase):
         #                 tools.geomagnet._default_obstime.datetime.date)
         self.assertEqual(geomagnet.obstime, tools.geomagnet.obstime)
 
+    def test_field_arrays(self):
+        n = 10
+        latitude = numpy.linspace(44, 46, n)
+        longitude = numpy.linspace(2, 4, n)
+        height = numpy.linspace(0, 2000, n)
+        geomagnet = Geomagnet(latitude=latitude, longitude=longitude, height=height)
+
+        # Check the raw arrays API, with preallocated buffers
+        out = numpy.empty((n, 3))
+        declination, inclination = numpy.empty(n), numpy.empty(n)
+        field = tools.geomagnet.field_arrays(
+            latitude,
+            longitude,
+            height,
+            out=out,
+            declination=declination,
+            inclination=inclination,
+        )
+        self.assertIs(field, out)
+        self.assertArray(out[:, 0], geomagnet.field.x, 12)
+        self.assertArray(out[:, 1], geomagnet.field.y, 12)
+        self.assertArray(out[:, 2], geomagnet.field.z, 12)
+        self.assertArray(declination, geomagnet.declination)
+        self.assertArray(inclination, geomagnet.inclination)
+
+        # Check the parallel evaluation
+        m = 50000
+        lat, lon, h = (numpy.resize(a, m) for a in (latitude, longitude, height))
+        field = tools.geomagnet.field_arrays(lat, lon, h, workers=4)
+        self.assertTrue(numpy.array_equal(field, tools.geomagnet.field_arrays(lat, lon, h)))
+        parallel = Geomagnet(latitude=lat, longitude=lon, height=h, workers=4)
+        self.assertArray(parallel.field.x[:n], geomagnet.field.x, 12)
+
+        # Check the default allocation
+        field = tools.geomagnet.field_arrays(45.0, 3.0, 1000.0, obstime=self.date)
+        self.assertEqual(field.shape, (1, 3))
+        self.assertField(CartesianRepresentation(x=field[0, 0], y=field[0, 1], z=field[0, 2]))
+
+    def test_lattice(self):
+        lattice = Geomagnet.lattice((44.5, 45.5), (2.5, 3.5), (0, 2000), shape=(5, 5, 3))
+        self.assertEqual(lattice.field.shape, (5, 5, 3, 3))
+        self.assertLess(lattice.error, 1e-09)
+
+        # Check the interpolation against the exact model
+        field = lattice(location=self.location)
+        self.assertField(field)
+
+        latitude = numpy.linspace(44.6, 45.4, 7)
+        longitude = numpy.linspace(3.4, 2.6, 7)
+        height = numpy.linspace(100, 1900, 7)
+        field = lattice(latitude, longitude, height)
+        exact = Geomagnet(latitude=latitude, longitude=longitude, height=height).field
+        delta = numpy.linalg.norm(numpy.array(field) - numpy.array(exact), axis=0)
+        self.assertTrue(numpy.all(delta <= 2 * lattice.error))
+
+        with self.assertRaises(ValueError) as context:
+            lattice(46.0, 3.0, 0.0)
+
+        # Check the I/O
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "lattice.hdf5")
+            lattice.dump(path)
+            other = Lattice.load(path)
+        self.assertEqual(other.model, lattice.model)
+        self.assertEqual(other.obstime, lattice.obstime)
+        self.assertEqual(other.error, lattice.error)
+        self.assertArray(other.field, lattice.field)
+
 
 if __name__ == "__main__":
     unittest.main()
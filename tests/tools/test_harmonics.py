@@ -0,0 +1,118 @@
+"""
+Unit tests for the grand.tools.harmonics module
+"""
+
+from pathlib import Path
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy
+
+from grand.libs import gull
+from grand.tools import harmonics
+from grand.tools.geomagnet import Geomagnet
+from tests import TestCase
+
+
+class HarmonicsTest(TestCase):
+    """Unit tests for the harmonics module"""
+
+    def test_snapshot(self):
+        snapshot = harmonics.Snapshot()
+        self.assertEqual(snapshot.model, "IGRF13")
+        self.assertEqual(snapshot.order, 13)
+        self.assertEqual(snapshot.altitude, (-1e03, 600e03))
+
+        # Magnetic field according to
+        # https://www.ngdc.noaa.gov/geomag/calculators/magcalc.shtml#igrfwmm
+        ref = (566e-09, 22999e-09, -41003e-09)
+        m = snapshot(45.0, 3.0)
+        self.assertEqual(m.shape, (3,))
+        for i in range(3):
+            self.assertAlmostEqual(m[i], ref[i], 6)
+
+        with self.assertRaises(ValueError) as context:
+            snapshot(45.0, 3.0, 1e06)
+
+        with self.assertRaises(ValueError) as context:
+            harmonics.Snapshot(date="1850-01-01")
+
+    def test_cache(self):
+        with tempfile.TemporaryDirectory() as tmpdir, mock.patch.object(
+            harmonics, "_CACHEDIR", Path(tmpdir)
+        ):
+            harmonics._load.cache_clear()
+            try:
+                a = harmonics.Snapshot(date="2012-05-17")
+                cached = list(Path(tmpdir).glob("IGRF13.*.npy"))
+                self.assertEqual(len(cached), 1)
+
+                # Check that the binary cache is used and consistent
+                harmonics._load.cache_clear()
+                with mock.patch.object(harmonics, "_parse") as parse:
+                    b = harmonics.Snapshot(date="2012-05-17")
+                    parse.assert_not_called()
+                self.assertEqual(a.order, b.order)
+                self.assertEqual(a.altitude, b.altitude)
+                self.assertTrue(numpy.array_equal(a(45.0, 3.0), b(45.0, 3.0)))
+            finally:
+                harmonics._load.cache_clear()
+
+    def test_gull(self):
+        # Check the consistency with GULL
+        rng = numpy.random.default_rng(0)
+        n = 25000
+        latitude = rng.uniform(-89, 89, n)
+        longitude = rng.uniform(-180, 180, n)
+        altitude = rng.uniform(0, 100e03, n)
+
+        cases = (("IGRF13", "2020-01-01"), ("IGRF13", "2003-07-14"), ("WMM2020", "2022-03-23"))
+        for model, date in cases:
+            a = harmonics.Snapshot(model, date)(latitude, longitude, altitude)
+            b = gull.Snapshot(model, date)(latitude, longitude, altitude)
+            self.assertEqual(a.shape, (n, 3))
+            self.assertLess(numpy.max(numpy.abs(a - b)), 1e-12)
+
+    def test_field(self):
+        # Check the multi-dates evaluation against single date snapshots
+        rng = numpy.random.default_rng(1)
+        n = 1000
+        latitude = rng.uniform(-89, 89, n)
+        longitude = rng.uniform(-180, 180, n)
+        altitude = rng.uniform(0, 100e03, n)
+        dates = numpy.array(("2020-01-01", "1950-06-01", "2007-03-03", "2021-11-30"))
+        obstime = dates[rng.integers(0, dates.size, n)]
+
+        field = harmonics.field(latitude, longitude, altitude, obstime)
+        self.assertEqual(field.shape, (n, 3))
+        for date in dates:
+            sel = obstime == date
+            snapshot = harmonics.Snapshot(date=date)
+            expected = snapshot(latitude[sel], longitude[sel], altitude[sel])
+            self.assertLess(numpy.max(numpy.abs(field[sel] - expected)), 1e-15)
+
+        # Check the Geomagnet interface, for both backends
+        for backend in ("gull", "numpy"):
+            geomagnet = Geomagnet(
+                latitude=latitude,
+                longitude=longitude,
+                height=altitude,
+                obstime=obstime,
+                backend=backend,
+            )
+            self.assertIsNone(geomagnet.snapshot)
+            delta = numpy.array(geomagnet.field) - field.T
+            self.assertLess(numpy.max(numpy.abs(delta)), 1e-12)
+
+    def test_backend(self):
+        a = Geomagnet(latitude=45.0, longitude=3.0, height=1000.0, backend="numpy")
+        b = Geomagnet(latitude=45.0, longitude=3.0, height=1000.0)
+        self.assertCartesian(a.field, b.field, 12)
+
+        with self.assertRaises(ValueError) as context:
+            Geomagnet(latitude=45.0, longitude=3.0, height=1000.0, backend="toto")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+"""
+Unit tests for the grand.tools.sampling module
+"""
+
+import unittest
+
+import numpy
+
+from grand import TimeAxis
+from grand.tools.sampling import time_slice
+from tests import TestCase
+
+
+class SamplingTest(TestCase):
+    """Unit tests for the sampling module"""
+
+    def test_time_axis(self):
+        t = -1e-07 + 5e-10 * numpy.arange(601)
+        axis = TimeAxis(-1e-07, 5e-10, 601)
+        self.assertEqual(axis.size, t.size)
+        self.assertEqual(axis.shape, t.shape)
+        self.assertQuantity(numpy.asarray(axis), t)
+        self.assertAlmostEqual(axis[1] - axis[0], 5e-10, 20)
+        self.assertAlmostEqual(axis[-1], t[-1], 20)
+        with self.assertRaises(IndexError):
+            axis[601]
+
+        # Slices are regular as well
+        for key in (slice(None, 300), slice(10, None, 3), slice(-5, None),
+                    slice(400, 100)):
+            sliced = axis[key]
+            self.assertIsInstance(sliced, TimeAxis)
+            self.assertQuantity(numpy.asarray(sliced), t[key])
+        self.assertQuantity(axis[::-1], t[::-1])
+
+        # Arithmetic operations return arrays
+        self.assertQuantity(axis * 1e09, t * 1e09)
+        self.assertQuantity(t - axis, numpy.zeros(t.size))
+
+    def test_compress(self):
+        t = -1e-07 + 5e-10 * numpy.arange(601)
+        axis = TimeAxis.compress(t)
+        self.assertIsInstance(axis, TimeAxis)
+        self.assertQuantity(numpy.asarray(axis), t)
+        self.assertIs(TimeAxis.compress(axis), axis)
+
+        # Irregular times are left unchanged
+        t[100] += 1e-11
+        self.assertIs(TimeAxis.compress(t), t)
+        self.assertIsInstance(TimeAxis.compress(t, rtol=0.1), TimeAxis)
+        self.assertIsInstance(TimeAxis.compress(t[:1]), numpy.ndarray)
+
+    def test_time_slice(self):
+        t = -1e-07 + 5e-10 * numpy.arange(601)
+        for times in (t, TimeAxis.compress(t)):
+            self.assertEqual(time_slice(times, (t[10], t[20])), slice(10, 21))
+            self.assertEqual(time_slice(times, (-1, t[5] + 1e-10)), slice(0, 6))
+            self.assertEqual(time_slice(times, (t[-2] - 1e-10, 1)), slice(599, 601))
+            window = time_slice(times, (1, 2))
+            self.assertEqual(window.stop - window.start, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
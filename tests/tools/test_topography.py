@@ -2,7 +2,9 @@
 Unit tests for the grand.tools.topography module
 """
 import os
+import tempfile
 import unittest
+from unittest import mock
 from pathlib import Path
 
 import numpy
@@ -15,7 +17,7 @@ import grand.tools as tools
 # from grand.tools.coordinates import ECEF, GeodeticRepresentation, LTP
 # from grand.tools import topography
 # from grand.tools.topography import Topography
-from tests import TestCase
+from tests import LocalStore, TestCase
 
 from grand import Topography, geoid_undulation  # , Reference
 from grand import topography
@@ -94,6 +96,89 @@ class TopographyTest(TestCase):
         self.assertTrue((topography.cachedir() / "N40E089.SRTMGL1.hgt").exists())
         self.assertTrue((topography.cachedir() / "N40E091.SRTMGL1.hgt").exists())
 
+    def test_topography_prefetch(self):
+        names = [f"N{lat}E{lon:03d}.SRTMGL1.hgt" for lat in (39, 40) for lon in (90, 91)]
+        blobs = {name: name.encode() * 1000 for name in names}
+        c = Geodetic(
+            latitude=numpy.array([39.5, 40.5]),
+            longitude=numpy.array([90.5, 91.5]),
+            height=numpy.array([0, 0]),
+        )
+
+        reports = []
+
+        def progress(done, total, basename):
+            reports.append((done, total, basename))
+
+        with LocalStore(blobs) as local, tempfile.TemporaryDirectory() as tmpdir:
+            cachedir = Path(tmpdir) / "topography"
+            cachedir.mkdir()
+            cache = store.Cache(Path(tmpdir) / "store")
+            with mock.patch.object(topography, "_CACHEDIR", cachedir), mock.patch.object(
+                store.cache, "_default_cache", cache
+            ):
+                topography.update_data(c, workers=3, progress=progress)
+
+                for name in names:
+                    self.assertEqual((cachedir / name).read_bytes(), blobs[name])
+                self.assertEqual(sorted(p.name for p in cachedir.iterdir()), sorted(names))
+                self.assertEqual(len(reports), len(names))
+                self.assertEqual([r[0] for r in reports], [1, 2, 3, 4])
+                self.assertEqual({r[1] for r in reports}, {len(names)})
+
+                # Cached tiles are not downloaded again
+                n = len(local.requests)
+                topography.update_data(c, progress=progress)
+                self.assertEqual(len(local.requests), n)
+
+                # Tiles are links to the verified store cache
+                for name in names:
+                    self.assertTrue((cachedir / name).is_symlink())
+                self.assertEqual(cache.size, sum(map(len, blobs.values())))
+
+                # Corrupted tiles are fetched again
+                name = names[0]
+                (cachedir / name).write_bytes(b"corrupted")
+                topography.update_data(c, progress=progress)
+                self.assertEqual((cachedir / name).read_bytes(), blobs[name])
+                self.assertEqual(len(local.requests), n + 1)
+
+                # Linked tiles are pinned in the store cache
+                cache.clear()
+                self.assertEqual(cache.evict(budget=0), 0)
+                for name in names:
+                    self.assertEqual((cachedir / name).read_bytes(), blobs[name])
+                topography.update_data(c, progress=progress)
+                self.assertEqual(len(local.requests), n + 1)
+
+                # Tiles are copied if symbolic links are not supported. Copies
+                # are verified, and they do not pin the store cache
+                with mock.patch.object(topography.os, "symlink", side_effect=OSError):
+                    for name in names:
+                        (cachedir / name).unlink()
+                    topography.update_data(c, progress=progress)
+                    cache.clear()
+                    self.assertEqual(cache.size, 0)
+                    for name in names:
+                        self.assertFalse((cachedir / name).is_symlink())
+                        self.assertEqual((cachedir / name).read_bytes(), blobs[name])
+
+                    (cachedir / name).write_bytes(b"corrupted")
+                    topography.update_data(c, progress=progress)
+                    self.assertEqual((cachedir / name).read_bytes(), blobs[name])
+
+                # Clearing the topography cache unpins the tiles
+                topography.update_data(c, progress=progress)
+                topography.update_data(clear=True)
+                cache.clear()
+                self.assertEqual(cache.size, 0)
+
+                # Missing tiles are reported
+                c = Geodetic(latitude=10.5, longitude=10.5, height=0)
+                with self.assertRaises(ValueError):
+                    topography.update_data(c, progress=progress)
+                self.assertFalse((cachedir / "N10E010.SRTMGL1.hgt").exists())
+
     def test_topography_elevation(self):
         # Fetch a test tile
         # geo = GeodeticRepresentation(latitude=39.5 * u.deg,
@@ -141,6 +226,37 @@ class TopographyTest(TestCase):
         # self.assertEqual(z3.unit, u.m)
         self.assertQuantity(z3, z1, 7)
 
+    def test_height_above_ground(self):
+        geo = Geodetic(latitude=39.5, longitude=90.5, height=0)
+        topography.update_data(geo)
+
+        # Compare to the reference computation, for various frames
+        o = numpy.ones(10)
+        height = 3000.0 + 100.0 * numpy.arange(o.size)
+        cv = Geodetic(latitude=39.5 * o, longitude=90.5 * o, height=height)
+        z = topography.elevation(cv)
+        h0 = height - z
+
+        h1 = topography.height_above_ground(cv)
+        self.assertEqual(h1.dtype, numpy.float64)
+        self.assertQuantity(h1, h0, 6)
+
+        h2 = topography.height_above_ground(ECEF(cv), chunk_size=3)
+        self.assertEqual(h2.size, o.size)
+        self.assertQuantity(h2, h0, 4)
+
+        h3 = topography.height_above_ground(ECEF(cv), dtype="f4")
+        self.assertEqual(h3.dtype, numpy.float32)
+        self.assertQuantity(h3, h0, 1)
+
+        frame = LTP(location=geo, orientation="ENU", magnetic=False)
+        ltp = LTP(ECEF(cv), frame=frame)
+        h4 = topography.height_above_ground(ltp, chunk_size=4)
+        self.assertQuantity(h4, h0, 4)
+
+        with self.assertRaises(ValueError):
+            topography.height_above_ground(cv, dtype="i4")
+
     def test_topography_distance(self):
         # Fetch a test tile
         # geo = GeodeticRepresentation(latitude=39.5 * u.deg,